@@ -0,0 +1,5 @@
+"""Routeverify pipeline: route sheet extraction, GPS verification and the DS-659 / DS-332 outputs.
+
+app.py is the Streamlit front end over these modules; ``python -m routeverify batch`` runs the
+same pipeline headless.
+"""
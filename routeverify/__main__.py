@@ -0,0 +1,191 @@
+"""Headless batch runner: ``python -m routeverify batch --sheets DIR --gps FILE --out DIR``.
+
+Every route sheet in DIR is extracted, verified against one shared Rastrac export and gets its
+Work Left Out workbook on a process pool sized to the machine. A DS-332 for the whole batch and
+summary.json (per-sheet counts, missed ITSAs and errors) are written next to the workbooks.
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from . import extraction
+from .ds332 import ds332_rows, render_ds332_pdf
+from .extraction import (CACHE_MAX_BYTES, ExtractionCache, ExtractionError, RouteTemplateStore, extract_route_sheet,
+                         make_client)
+from .geometry import StreetGeometry, read_centerlines
+from .gps import RastracGps, build_route_entry, load_rastrac_gps
+from .utils import CACHE_DIR, unique_filename
+from .wlo import TEMPLATE_PATH, get_truly_missed_df, work_left_out_filename, work_left_out_key, work_left_out_xlsx
+
+if TYPE_CHECKING:
+    import anthropic
+
+logger = logging.getLogger("routeverify")
+
+SHEET_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.pdf')
+
+# This worker's copy of the shared export and its Anthropic client, set by _init_worker
+_gps: Optional[RastracGps] = None
+_client: Optional['anthropic.Anthropic'] = None
+
+
+def _init_worker(gps: RastracGps, api_key: str):
+    """Per-process setup: the GPS export arrives once per worker, not once per sheet."""
+    global _gps, _client
+    _gps, _client = gps, make_client(api_key)
+    try:
+        cache = ExtractionCache(os.path.join(CACHE_DIR, "extractions.sqlite3"), CACHE_MAX_BYTES)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Extraction cache disabled: {e}")
+        cache = None
+    try:
+        templates = RouteTemplateStore(os.path.join(CACHE_DIR, "route_templates.sqlite3"))
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Route templates disabled: {e}")
+        templates = None
+    extraction.configure(cache, templates)
+
+
+def process_sheet(i: int, path: str, write_wlo: bool = True) -> Dict:
+    """Extract, verify and render one sheet; numbering and truck matching follow the app's batch upload."""
+    filename = os.path.basename(path)
+    result = {'sheet': filename, 'truck': f"TBD-{i + 1}", 'route': f"BATCH-{i + 1}"}
+    try:
+        with open(path, 'rb') as f:
+            file_bytes = f.read()
+        claude_json = extract_route_sheet(_client, file_bytes, filename)
+        if not claude_json.get('itsas'):
+            raise ExtractionError("No ITSAs found in route sheet.")
+        unit = _gps.unit_in_name(filename)
+        truck = _gps.unit_labels[unit] if unit else result['truck']
+        entry = build_route_entry(truck, result['route'], claude_json, _gps)
+        wlo_key = work_left_out_key(entry) if write_wlo else None
+        result.update(
+            truck=truck, gps_unit=entry['gps_unit'],
+            section=claude_json.get('section', ''), district=claude_json.get('district', ''),
+            done=int(entry['done']), total=int(entry['total']), pct=float(entry['pct']),
+            missed=get_truly_missed_df(entry)['ITSA #'].astype(str).tolist(),
+            template_match=claude_json.get('template_match'),
+            ds332_row=ds332_rows([entry])[0],
+            wlo=(work_left_out_filename(entry), work_left_out_xlsx(*wlo_key)) if wlo_key else None,
+        )
+    except json.JSONDecodeError as e:
+        result['error'] = f"Claude returned invalid JSON: {e}"
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def find_sheets(sheets_dir: str) -> List[str]:
+    return sorted(os.path.join(sheets_dir, name) for name in os.listdir(sheets_dir)
+                  if name.lower().endswith(SHEET_EXTENSIONS))
+
+
+def run_batch(args) -> int:
+    sheets = find_sheets(args.sheets)
+    if not sheets:
+        logger.error(f"No route sheets ({', '.join(SHEET_EXTENSIONS)}) in {args.sheets}")
+        return 2
+    api_key = args.api_key or os.getenv("CLAUDE_API_KEY", "")
+    if not api_key:
+        logger.error("No Anthropic API key: set CLAUDE_API_KEY or pass --api-key")
+        return 2
+    shift_date = date.fromisoformat(args.date) if args.date else date.today()
+    os.makedirs(args.out, exist_ok=True)
+    started = time.time()
+
+    geometry: Optional[StreetGeometry] = None
+    centerlines = args.centerlines or os.getenv("ROUTEVERIFY_CENTERLINES", "")
+    if centerlines:
+        geometry = StreetGeometry(read_centerlines(centerlines))
+        logger.info(f"Street geometry: {len(geometry.names)} features from {centerlines}")
+    gps = load_rastrac_gps(args.gps, geometry=geometry)
+    logger.info(f"GPS: {len(gps.streets)} streets, {len(gps.by_unit)} units from {args.gps}")
+
+    write_wlo = os.path.exists(TEMPLATE_PATH)
+    if not write_wlo:
+        logger.warning(f"WLO template not found at {TEMPLATE_PATH} — skipping Work Left Out workbooks")
+
+    results: List[Optional[Dict]] = [None] * len(sheets)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(gps, api_key)) as pool:
+        futures = {pool.submit(process_sheet, i, path, write_wlo): i for i, path in enumerate(sheets)}
+        for n, fut in enumerate(as_completed(futures), 1):
+            result = results[futures[fut]] = fut.result()
+            if 'error' in result:
+                logger.warning(f"[{n}/{len(sheets)}] {result['sheet']}: {result['error']}")
+            else:
+                logger.info(f"[{n}/{len(sheets)}] {result['sheet']}: {result['done']}/{result['total']} ITSAs")
+
+    # Outputs are written here, in sheet order, so clashing WLO names get stable suffixes
+    names: Dict[str, int] = {}
+    rows = []
+    for result in results:
+        if 'ds332_row' in result:
+            rows.append(result.pop('ds332_row'))
+        wlo = result.pop('wlo', None)
+        if wlo:
+            filename, data = wlo
+            filename = unique_filename(filename, names)
+            with open(os.path.join(args.out, filename), 'wb') as f:
+                f.write(data)
+            result['wlo_file'] = filename
+
+    ds332_file = None
+    if rows:
+        ds332_file = f"DS332_All_{shift_date.strftime('%Y%m%d')}.pdf"
+        with open(os.path.join(args.out, ds332_file), 'wb') as f:
+            f.write(render_ds332_pdf(tuple(rows), shift_date.strftime("%m/%d/%Y"), args.garage))
+
+    verified = [r for r in results if 'error' not in r]
+    total_done = sum(r['done'] for r in verified)
+    total_all = sum(r['total'] for r in verified)
+    summary = {
+        'date': shift_date.isoformat(),
+        'garage': args.garage,
+        'gps': os.path.abspath(args.gps),
+        'sheets': len(sheets),
+        'verified': len(verified),
+        'failed': len(sheets) - len(verified),
+        'done': total_done,
+        'total': total_all,
+        'pct': round(total_done / total_all * 100, 1) if total_all > 0 else 0.0,
+        'ds332_file': ds332_file,
+        'elapsed_s': round(time.time() - started, 1),
+        'routes': results,
+    }
+    with open(os.path.join(args.out, "summary.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    logger.info(f"{len(verified)}/{len(sheets)} sheets verified, {total_done}/{total_all} ITSAs complete "
+                f"({summary['pct']}%) in {summary['elapsed_s']}s → {args.out}")
+    return 0 if len(verified) == len(sheets) else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog="python -m routeverify", description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    batch = sub.add_parser("batch", help="verify a directory of route sheets against one GPS export")
+    batch.add_argument("--sheets", required=True, help="directory of DS-659 route sheets (jpg/png/pdf)")
+    batch.add_argument("--gps", required=True, help="Rastrac GPS CSV shared by all sheets")
+    batch.add_argument("--out", required=True, help="output directory")
+    batch.add_argument("--centerlines", default="", help="street centerline CSV (default: $ROUTEVERIFY_CENTERLINES)")
+    batch.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    batch.add_argument("--date", default="", help="shift date for the DS-332, YYYY-MM-DD (default: today)")
+    batch.add_argument("--garage", default="", help="garage printed on the DS-332")
+    batch.add_argument("--api-key", default="", help="Anthropic API key (default: $CLAUDE_API_KEY)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    return run_batch(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
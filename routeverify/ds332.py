@@ -0,0 +1,238 @@
+"""DS-332 Daily Route Assignment PDF."""
+import functools
+import io
+import re
+import zipfile
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from .utils import chunk_list, unique_filename
+
+# ─── DS-332 DAILY ROUTE ASSIGNMENT PDF ────────────────────────────────────────
+
+DS332_COLUMNS = ['#', 'Truck #', 'Route', 'Section', 'District', 'Material',
+                 'Sanitation Workers', '% Done', 'Done', 'Missed', 'Remarks']
+DS332_PAGE_ROWS = 20  # routes per printed page; short pages are padded so the form looks complete
+DS332_GROUP_COLUMNS = {'district': 3, 'section': 2}  # ds332_rows() field per split option
+
+
+def ds332_rows(route_entries: list) -> tuple:
+    """Exactly what DS-332 prints per route, as a hashable tuple — the render memo key.
+
+    (truck, route, section, district, material, workers, pct, done, total, remarks)
+    """
+    rows = []
+    for r in route_entries:
+        cj = r.get('claude_json', {})
+        shift_start = r.get('shift_start', '')
+        shift_end = r.get('shift_end', '')
+        notes = r.get('notes', '')
+        manual_count = len(r.get('manual_overrides', {}))
+
+        remarks_parts = []
+        if shift_start or shift_end:
+            remarks_parts.append(f"{shift_start}-{shift_end}")
+        if notes:
+            remarks_parts.append(notes)
+        if manual_count > 0:
+            remarks_parts.append(f"({manual_count} manual)")
+
+        rows.append((
+            r.get('truck', ''), r.get('route', ''), cj.get('section', ''), cj.get('district', ''),
+            cj.get('material', ''), r.get('workers', '').strip() or '',
+            r.get('pct', 0), r.get('done', 0), r.get('total', 0), ' '.join(remarks_parts).strip(),
+        ))
+    return tuple(rows)
+
+
+@functools.cache
+def ds332_styles() -> Dict:
+    """Paragraph and table styles shared by every DS-332 render in this process."""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.platypus import TableStyle
+
+    return {
+        'center_bold': ParagraphStyle('CenterBold', fontName='Helvetica-Bold', fontSize=11, alignment=TA_CENTER),
+        'left_sm': ParagraphStyle('LeftSm', fontName='Helvetica', fontSize=8, alignment=TA_LEFT),
+        'header': TableStyle([
+            ('VALIGN',      (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING',  (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING',(0,0), (-1, -1), 4),
+            ('BOX',         (0, 0), (-1, -1), 1, colors.black),
+            ('LINEBEFORE',  (1, 0), (1, -1), 1, colors.black),
+            ('LINEBEFORE',  (2, 0), (2, -1), 1, colors.black),
+        ]),
+        'main': TableStyle([
+            # Header row
+            ('BACKGROUND',    (0, 0), (-1, 0), colors.HexColor('#1a1a1a')),
+            ('TEXTCOLOR',     (0, 0), (-1, 0), colors.white),
+            ('FONTNAME',      (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE',      (0, 0), (-1, 0), 7.5),
+            ('ALIGN',         (0, 0), (-1, 0), 'CENTER'),
+            ('VALIGN',        (0, 0), (-1, 0), 'MIDDLE'),
+            # Data rows
+            ('FONTNAME',      (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE',      (0, 1), (-1, -1), 7.5),
+            ('ALIGN',         (0, 1), (-1, -1), 'CENTER'),
+            ('ALIGN',         (6, 1), (6, -1), 'LEFT'),   # workers left-aligned
+            ('ALIGN',         (10, 1),(10, -1),'LEFT'),   # remarks left-aligned
+            ('VALIGN',        (0, 1), (-1, -1), 'MIDDLE'),
+            # Alternating rows
+            ('ROWBACKGROUNDS',(0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
+            # Grid
+            ('GRID',          (0, 0), (-1, -1), 0.4, colors.black),
+            # Row heights
+            ('ROWHEIGHT',     (0, 0), (0, 0), 16),
+            ('ROWHEIGHT',     (0, 1), (-1, -1), 14),
+            ('TOPPADDING',    (0, 0), (-1, -1), 2),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ]),
+        'summary': TableStyle([
+            ('BOX',          (0, 0), (-1, -1), 0.5, colors.black),
+            ('INNERGRID',    (0, 0), (-1, -1), 0.3, colors.grey),
+            ('BACKGROUND',   (0, 0), (-1, -1), colors.HexColor('#e8e8e8')),
+            ('TOPPADDING',   (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING',(0, 0), (-1, -1), 4),
+            ('LEFTPADDING',  (0, 0), (-1, -1), 6),
+        ]),
+        'signature': TableStyle([
+            ('FONTSIZE',     (0, 0), (-1, -1), 8),
+            ('TOPPADDING',   (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING',(0, 0), (-1, -1), 4),
+            ('BOX',          (0, 0), (-1, -1), 0.5, colors.black),
+            ('INNERGRID',    (0, 0), (-1, -1), 0.3, colors.grey),
+            ('LEFTPADDING',  (0, 0), (-1, -1), 4),
+        ]),
+    }
+
+
+def render_ds332_pdf(rows: tuple, date_str: str, garage: str = '') -> bytes:
+    """DS-332 PDF for ds332_rows() output — landscape, matching actual DSNY form.
+
+    Routes are laid out DS332_PAGE_ROWS per page, each page a small table under its own form
+    header, so layout cost stays linear and pages never split mid-form. Totals and the
+    signature block close the last page.
+    """
+    # reportlab is only imported once someone exports
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table
+
+    styles = ds332_styles()
+    center_bold, left_sm = styles['center_bold'], styles['left_sm']
+
+    page = landscape(letter)  # 11 x 8.5 inches
+    buf = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buf, pagesize=page,
+        leftMargin=0.4*inch, rightMargin=0.4*inch,
+        topMargin=0.35*inch, bottomMargin=0.35*inch
+    )
+
+    elements = []
+    W = page[0] - 0.8*inch  # usable width
+
+    # ── Header block ──────────────────────────────────────────────────────────
+    section_h, district = (rows[0][2], rows[0][3]) if rows else ('', '')
+    garage_text = f"   <b>GARAGE:</b> {garage}" if garage else ""
+
+    # ── Main data table ────────────────────────────────────────────────────────
+    col_w = [0.25*inch, 0.75*inch, 0.55*inch, 0.65*inch, 0.65*inch, 0.85*inch,
+             2.4*inch, 0.5*inch, 0.45*inch, 0.5*inch, 1.55*inch]
+
+    pages = chunk_list(list(rows), DS332_PAGE_ROWS) or [[]]
+    for page_no, page_rows in enumerate(pages, start=1):
+        if page_no > 1:
+            elements.append(PageBreak())
+        page_text = f"          <b>PAGE:</b> {page_no} of {len(pages)}" if len(pages) > 1 else ""
+        hdr_data = [
+            [
+                Paragraph("NEW YORK CITY\nDEPARTMENT OF SANITATION", center_bold),
+                Paragraph("DAILY ROUTE ASSIGNMENT\nDS-332", center_bold),
+                Paragraph(
+                    f"<b>DATE:</b> {date_str}          "
+                    f"<b>DISTRICT:</b> {district}          "
+                    f"<b>SECTION:</b> {section_h}"
+                    f"{garage_text}{page_text}",
+                    left_sm
+                ),
+            ]
+        ]
+        hdr_table = Table(hdr_data, colWidths=[2.6*inch, 3.0*inch, W - 5.6*inch])
+        hdr_table.setStyle(styles['header'])
+        elements.append(hdr_table)
+        elements.append(Spacer(1, 0.08*inch))
+
+        first = (page_no - 1) * DS332_PAGE_ROWS
+        table_data = [DS332_COLUMNS]
+        for i, (truck, route, section, dist, material, workers, pct, done, total, remarks) in enumerate(page_rows, start=first + 1):
+            table_data.append([str(i), truck, route, section, dist, material, workers,
+                               f"{pct}%", str(done), str(total - done), remarks])
+        table_data.extend([[''] * len(DS332_COLUMNS)] * (DS332_PAGE_ROWS - len(page_rows)))
+
+        main_table = Table(table_data, colWidths=col_w)
+        main_table.setStyle(styles['main'])
+        elements.append(main_table)
+        elements.append(Spacer(1, 0.12*inch))
+
+    # ── Summary row ────────────────────────────────────────────────────────────
+    total_done_all = sum(row[7] for row in rows)
+    total_itsas    = sum(row[8] for row in rows)
+    total_missed   = total_itsas - total_done_all
+    overall_pct    = round(total_done_all / total_itsas * 100, 1) if total_itsas else 0.0
+
+    summary_data = [[
+        Paragraph(f"<b>TOTAL ROUTES:</b> {len(rows)}", left_sm),
+        Paragraph(f"<b>TOTAL ITSAs:</b> {total_itsas}", left_sm),
+        Paragraph(f"<b>COMPLETED:</b> {total_done_all}", left_sm),
+        Paragraph(f"<b>MISSED:</b> {total_missed}", left_sm),
+        Paragraph(f"<b>OVERALL:</b> {overall_pct}%", left_sm),
+    ]]
+    summary_table = Table(summary_data, colWidths=[W/5]*5)
+    summary_table.setStyle(styles['summary'])
+    elements.append(summary_table)
+    elements.append(Spacer(1, 0.15*inch))
+
+    # ── Signature block ────────────────────────────────────────────────────────
+    sig_data = [[
+        Paragraph("Supervisor Signature: _______________________________", left_sm),
+        Paragraph(f"Date: {date_str}", left_sm),
+        Paragraph("Title: Supervisor MTS", left_sm),
+        Paragraph("Badge #: 5104", left_sm),
+        Paragraph("Time: ____________", left_sm),
+    ]]
+    sig_table = Table(sig_data, colWidths=[W*0.35, W*0.15, W*0.2, W*0.15, W*0.15])
+    sig_table.setStyle(styles['signature'])
+    elements.append(sig_table)
+
+    doc.build(elements)
+    buf.seek(0)
+    return buf.getvalue()
+
+
+def generate_ds332_pdf(route_entries: list, date_str: str = None, garage: str = '') -> bytes:
+    """Generate DS-332 Daily Route Assignment PDF — landscape, matching actual DSNY form."""
+    if not date_str:
+        date_str = datetime.now().strftime("%m/%d/%Y")
+    return render_ds332_pdf(ds332_rows(route_entries), date_str, garage)
+
+
+def build_ds332_zip(rows: tuple, date_str: str, garage: str, by: str,
+                    render: Callable[..., bytes] = render_ds332_pdf) -> bytes:
+    """One DS-332 per district or section (``by``), grouped in a single pass and zipped."""
+    column = DS332_GROUP_COLUMNS[by]
+    groups: Dict[str, List[tuple]] = {}
+    for row in rows:
+        groups.setdefault(str(row[column] or 'UNKNOWN'), []).append(row)
+    names: Dict[str, int] = {}
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, group in groups.items():
+            # Distinct groups can sanitize alike ('Q 1', 'Q_1'); the later one gets a ' (2)' suffix
+            safe_name = re.sub(r'[^\w-]+', '_', name).strip('_') or 'UNKNOWN'
+            zf.writestr(unique_filename(f"DS332_{by.title()}_{safe_name}.pdf", names),
+                        render(tuple(group), date_str, garage))
+    return buf.getvalue()
+
@@ -0,0 +1,457 @@
+"""Route sheet → route JSON: Claude vision/text extraction, its on-disk cache and stored route templates.
+
+Callers pass their own Anthropic client into each extraction; configure() optionally points the
+module at the shared extraction cache and template store.
+anthropic, pypdf and pytesseract are imported on first use, so importing this module stays cheap.
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+from .utils import sqlite_connection
+
+if TYPE_CHECKING:
+    import anthropic
+
+logger = logging.getLogger(__name__)
+
+# ─── EXTRACTION CACHE ──────────────────────────────────────────────────────────
+
+CACHE_MAX_BYTES = int(float(os.getenv("ROUTEVERIFY_CACHE_MAX_MB", "50")) * 1024 * 1024)
+
+
+class ExtractionCache:
+    """On-disk cache of Claude route JSON keyed by sheet bytes + prompt/model, evicted LRU by size.
+
+    Shared across sessions and worker threads; each operation opens its own SQLite connection.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extractions ("
+                " key TEXT PRIMARY KEY, claude_json TEXT NOT NULL,"
+                " size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite_connection(self.path)
+
+    @staticmethod
+    def make_key(file_bytes: bytes, prompt: str) -> str:
+        """SHA-256 of the raw upload, salted with the model and prompt so prompt edits invalidate entries."""
+        version = hashlib.sha256((CLAUDE_MODEL + prompt).encode("utf-8")).hexdigest()[:16]
+        return f"{hashlib.sha256(file_bytes).hexdigest()}:{version}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT claude_json FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row:
+                conn.execute("UPDATE extractions SET last_used = ? WHERE key = ?", (time.time(), key))
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, claude_json: Dict):
+        payload = json.dumps(claude_json, separators=(',', ':'))
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO extractions (key, claude_json, size, last_used) VALUES (?, ?, ?, ?)",
+                         (key, payload, len(payload), time.time()))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in conn.execute("SELECT key, size FROM extractions ORDER BY last_used").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM extractions WHERE key = ?", (old_key,))
+                    total -= size
+
+    def stats(self) -> Dict:
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+# ─── ROUTE TEMPLATES ───────────────────────────────────────────────────────────
+
+TEMPLATE_HEADER_CROP = 0.25          # top share of a sheet photo holding the section/route/district fields
+TEMPLATE_HEADER_MIN_SIMILARITY = 0.7  # token Jaccard for OCR'd headers; OCR noise varies photo to photo
+TEMPLATE_TEXT_MIN_SIMILARITY = 0.9    # token Jaccard for PDF text
+TEMPLATE_FINGERPRINTS_PER_ROUTE = 10
+TEMPLATE_MIN_SIMILARITY = {'header': TEMPLATE_HEADER_MIN_SIMILARITY, 'pdf': TEMPLATE_TEXT_MIN_SIMILARITY}
+
+_TOKEN_RE = re.compile(r'[A-Z0-9]+(?:[/:.-][A-Z0-9]+)*')
+_DATE_TIME_RE = re.compile(r'\d+[/:.-]\d+(?:[/:.-]\d+)*')
+
+
+def text_tokens(text: str) -> set:
+    """Upper-cased word/number tokens of sheet text, with dates and times dropped since they change daily."""
+    return {t for t in _TOKEN_RE.findall(text.upper()) if not _DATE_TIME_RE.fullmatch(t)}
+
+
+def header_text(image_bytes: bytes) -> str:
+    """OCR of the sheet photo's header band — the part that names the section, route and district."""
+    import pytesseract
+    from PIL import Image, ImageOps
+    img = ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes))).convert("L")
+    return pytesseract.image_to_string(img.crop((0, 0, img.width, int(img.height * TEMPLATE_HEADER_CROP))))
+
+
+def pdf_text(file_bytes: bytes) -> str:
+    from pypdf import PdfReader
+    return "".join(p.extract_text() or "" for p in PdfReader(io.BytesIO(file_bytes)).pages)
+
+
+def sheet_fingerprint(file_bytes: bytes, filename: str) -> Optional[tuple[str, str]]:
+    """Cheap local (kind, fingerprint) for a route sheet, or None if the file can't be read.
+
+    PDFs use the tokens of their whole text; photos use the OCR'd header, since the rest of a
+    DS-659 photo is form layout shared by every route.
+    """
+    try:
+        if filename.split('.')[-1].lower() == 'pdf':
+            kind, text = 'pdf', pdf_text(file_bytes)
+        else:
+            kind, text = 'header', header_text(file_bytes)
+    except Exception as e:
+        logger.warning(f"Could not fingerprint {filename}: {e}")
+        return None
+    tokens = text_tokens(text)
+    return (kind, " ".join(sorted(tokens))) if tokens else None
+
+
+def _names_route(key: tuple[str, str, str], tokens: set) -> bool:
+    """True if a sheet's tokens carry the route's section, route and (when known) district."""
+    section, route, _ = key
+    return bool(section and route) and all(text_tokens(value) <= tokens for value in key if value)
+
+
+def _fingerprint_similarity(a: str, b: str) -> float:
+    ta, tb = set(a.split()), set(b.split())
+    return len(ta & tb) / len(ta | tb) if ta | tb else 0.0
+
+
+class RouteTemplateStore:
+    """Validated ITSA lists per section/route/district, plus the sheet fingerprints that produced them."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with sqlite_connection(path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS templates ("
+                " section TEXT NOT NULL, route TEXT NOT NULL, district TEXT NOT NULL,"
+                " claude_json TEXT NOT NULL, updated_at REAL NOT NULL,"
+                " PRIMARY KEY (section, route, district))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                " kind TEXT NOT NULL, fingerprint TEXT NOT NULL,"
+                " section TEXT NOT NULL, route TEXT NOT NULL, district TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            # whole-photo hashes from earlier versions matched the form layout, not the route
+            conn.execute("DELETE FROM fingerprints WHERE kind = 'image'")
+
+    @staticmethod
+    def _route_key(claude_json: Dict) -> tuple[str, str, str]:
+        return tuple(str(claude_json.get(k, '')).upper().strip() for k in ('section', 'route', 'district'))
+
+    def match(self, kind: str, fingerprint: str) -> Optional[tuple[Dict, float]]:
+        """Return (stored route JSON, similarity) when exactly one route matches, else None.
+
+        A route matches when one of its stored fingerprints clears the absolute similarity
+        threshold for ``kind`` and the new sheet's text names that route's section and route.
+        """
+        tokens = set(fingerprint.split())
+        with sqlite_connection(self.path) as conn:
+            rows = conn.execute("SELECT fingerprint, section, route, district FROM fingerprints WHERE kind = ?",
+                                (kind,)).fetchall()
+            best: Dict[tuple, float] = {}
+            for fp, *key in rows:
+                key = tuple(key)
+                sim = _fingerprint_similarity(fingerprint, fp)
+                if sim >= TEMPLATE_MIN_SIMILARITY[kind] and _names_route(key, tokens):
+                    best[key] = max(sim, best.get(key, 0.0))
+            if len(best) != 1:
+                return None
+            (key, sim), = best.items()
+            row = conn.execute("SELECT claude_json FROM templates WHERE section = ? AND route = ? AND district = ?",
+                               key).fetchone()
+        return (json.loads(row[0]), sim) if row else None
+
+    def save(self, kind: str, fingerprint: str, claude_json: Dict):
+        key = self._route_key(claude_json)
+        stored = {k: v for k, v in claude_json.items() if k != 'template_match'}
+        now = time.time()
+        with sqlite_connection(self.path) as conn:
+            conn.execute("INSERT OR REPLACE INTO templates (section, route, district, claude_json, updated_at) "
+                         "VALUES (?, ?, ?, ?, ?)", (*key, json.dumps(stored), now))
+            conn.execute("INSERT INTO fingerprints (kind, fingerprint, section, route, district, created_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", (kind, fingerprint, *key, now))
+            conn.execute(
+                "DELETE FROM fingerprints WHERE section = ? AND route = ? AND district = ? AND rowid NOT IN ("
+                " SELECT rowid FROM fingerprints WHERE section = ? AND route = ? AND district = ?"
+                " ORDER BY created_at DESC LIMIT ?)", (*key, *key, TEMPLATE_FINGERPRINTS_PER_ROUTE))
+
+
+# Set by configure(); the Streamlit app and the batch runner each build their own. The Anthropic
+# client is never module state: it carries a supervisor's API key, so it travels with each call.
+extraction_cache: Optional[ExtractionCache] = None
+route_templates: Optional[RouteTemplateStore] = None
+
+
+def configure(cache: Optional[ExtractionCache] = None, templates: Optional[RouteTemplateStore] = None):
+    """Point extraction at the (optional) extraction cache and route template store."""
+    global extraction_cache, route_templates
+    extraction_cache, route_templates = cache, templates
+
+
+def lookup_route_template(fingerprint: Optional[tuple[str, str]]) -> Optional[Dict]:
+    """Stored route JSON for a confidently matching sheet, tagged with its similarity as ``template_match``."""
+    if not route_templates or not fingerprint:
+        return None
+    match = route_templates.match(*fingerprint)
+    if not match:
+        return None
+    claude_json, similarity = match
+    claude_json['template_match'] = round(similarity, 3)
+    return claude_json
+
+
+def remember_route_template(fingerprint: Optional[tuple[str, str]], claude_json: Dict):
+    """Store a high-confidence extraction so later photos of the same route can skip Claude.
+
+    Only sheets whose section and route were both read are stored, and only if the sheet's own
+    text names them — otherwise a later sheet could never confirm the match.
+    """
+    if not route_templates or not fingerprint or not claude_json.get('itsas'):
+        return
+    if claude_json.get('extraction_confidence') != 'high':
+        return
+    if not _names_route(RouteTemplateStore._route_key(claude_json), set(fingerprint[1].split())):
+        return
+    try:
+        route_templates.save(*fingerprint, claude_json)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not store route template: {e}")
+
+# ─── CLAUDE VISION ─────────────────────────────────────────────────────────────
+
+def compress_image(image_bytes: bytes, max_bytes: int = 4_500_000) -> tuple[bytes, str]:
+    from PIL import Image
+    if len(image_bytes) <= max_bytes:
+        return image_bytes, "image/jpeg"
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    quality = 85
+    while quality >= 30:
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality)
+        data = buf.getvalue()
+        if len(data) <= max_bytes:
+            return data, "image/jpeg"
+        quality -= 10
+    img = img.resize((img.width // 2, img.height // 2), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=75)
+    return buf.getvalue(), "image/jpeg"
+
+
+CLAUDE_MODEL = "claude-opus-4-5-20251101"
+MEDIA_MAP = {'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+IMAGE_PROMPT = (
+    "This is a DSNY DS-659 Route Narrative form. "
+    "Extract ALL route information and return ONLY valid JSON.\n\n"
+    "JSON structure:\n{\n"
+    '  "section": "section code",\n'
+    '  "route": "route number",\n'
+    '  "district": "district code",\n'
+    '  "material": "material description",\n'
+    '  "vehicle_type": "vehicle type",\n'
+    '  "itsas": [\n    {"number": 1, "street": "STREET NAME", "from_cross": "FROM", "to_cross": "TO", "side": "B"}\n  ],\n'
+    '  "extraction_confidence": "high|medium|low"\n}\n\n'
+    "Rules:\n- Extract EVERY ITSA row\n- Use UPPERCASE for street names\n- Side: B=Both, R=Right, L=Left\n- Return ONLY the JSON"
+)
+
+PDF_PROMPT = (
+    "This is DSNY DS-659 route sheet text. Extract all data and return ONLY valid JSON:\n"
+    '{"section":"","route":"","district":"","material":"","itsas":[{"number":1,"street":"","from_cross":"","to_cross":"","side":"B"}],'
+    '"extraction_confidence":"high|medium|low"}\n\nText:\n'
+)
+
+EXTRACTION_MAX_RETRIES = 4
+EXTRACTION_BACKOFF_BASE = 2.0  # seconds, doubled per attempt
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 529}
+
+# ─── CLAUDE CLIENT ─────────────────────────────────────────────────────────────
+
+CLAUDE_MAX_CONNECTIONS = 20        # covers the 16 batch worker threads plus single adds
+CLAUDE_KEEPALIVE_SECONDS = 60.0    # idle connections survive the gaps between uploads
+CLAUDE_CONNECT_TIMEOUT = 10.0
+CLAUDE_READ_TIMEOUT = 180.0        # a dense sheet can take minutes to transcribe
+
+
+class ConnectionStats:
+    """Requests vs. freshly opened connections on one client — how often the pool is reused.
+
+    Fed by httpcore's trace hook; ``setup_seconds`` is time spent on TCP connect and TLS handshakes.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.setup_seconds = 0.0
+        self._lock = threading.Lock()
+        self._started = threading.local()
+
+    @property
+    def reused(self) -> int:
+        return max(0, self.requests - self.connections)
+
+    def on_request(self, request):
+        request.extensions['trace'] = self._trace
+        with self._lock:
+            self.requests += 1
+
+    def _trace(self, event: str, info: dict):
+        if event == 'connection.connect_tcp.started':
+            self._started.at = time.perf_counter()
+        elif event in ('connection.connect_tcp.complete', 'connection.start_tls.complete'):
+            elapsed = time.perf_counter() - getattr(self._started, 'at', time.perf_counter())
+            self._started.at = time.perf_counter()
+            with self._lock:
+                self.connections += event == 'connection.connect_tcp.complete'
+                self.setup_seconds += elapsed
+
+
+def make_client(api_key: str, stats: Optional[ConnectionStats] = None, **kwargs) -> 'anthropic.Anthropic':
+    """Anthropic client on a keep-alive connection pool sized for batch extraction.
+
+    Build one per API key and keep it: the pool, and the TLS sessions in it, live as long as the client.
+    Retries are handled by create_message_with_retry so backoff is shared across batch workers.
+    """
+    import anthropic
+    import httpx2  # the SDK's HTTP stack from anthropic 1.13 on; its client only accepts httpx2 config objects
+
+    http_client = anthropic.DefaultHttpxClient(
+        limits=httpx2.Limits(max_connections=CLAUDE_MAX_CONNECTIONS,
+                            max_keepalive_connections=CLAUDE_MAX_CONNECTIONS,
+                            keepalive_expiry=CLAUDE_KEEPALIVE_SECONDS),
+        timeout=anthropic.Timeout(CLAUDE_READ_TIMEOUT, connect=CLAUDE_CONNECT_TIMEOUT),
+        event_hooks={'request': [stats.on_request]} if stats else None,
+    )
+    return anthropic.Anthropic(api_key=api_key, max_retries=0, http_client=http_client, **kwargs)
+
+
+class ExtractionError(Exception):
+    """Raised when a route sheet can't be turned into route JSON."""
+
+
+def _is_retryable(err: Exception) -> bool:
+    import anthropic
+    if isinstance(err, (anthropic.RateLimitError, anthropic.APIConnectionError)):
+        return True
+    return isinstance(err, anthropic.APIStatusError) and err.status_code in RETRYABLE_STATUS_CODES
+
+
+def _retry_delay(attempt: int, err: Exception) -> float:
+    response = getattr(err, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return EXTRACTION_BACKOFF_BASE * 2 ** attempt + random.uniform(0, 1)
+
+
+def create_message_with_retry(api_client: 'anthropic.Anthropic', **kwargs) -> str:
+    """Call Claude on ``api_client`` and return the raw text, backing off on rate-limit/overload errors."""
+    import anthropic
+    for attempt in range(EXTRACTION_MAX_RETRIES + 1):
+        try:
+            msg = api_client.messages.create(**kwargs)
+            return "".join(b.text for b in msg.content if b.type == "text").strip()
+        except anthropic.APIError as e:
+            if attempt == EXTRACTION_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _retry_delay(attempt, e)
+            logger.warning(f"Claude call failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def parse_claude_json(raw: str) -> Dict:
+    json_match = re.search(r'\{.*\}', raw, re.DOTALL)
+    if json_match:
+        return json.loads(json_match.group())
+    return json.loads(raw)
+
+
+def extract_image_json(api_client: 'anthropic.Anthropic', image_bytes: bytes, media_type: str) -> tuple[Dict, str]:
+    """Run a route sheet photo through Claude. Returns (route JSON, raw response); raises on failure."""
+    image_bytes, media_type = compress_image(image_bytes)
+    b64 = base64.standard_b64encode(image_bytes).decode("utf-8")
+    raw = create_message_with_retry(
+        api_client, model=CLAUDE_MODEL, max_tokens=4096,
+        messages=[{"role": "user", "content": [
+            {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": b64}},
+            {"type": "text", "text": IMAGE_PROMPT}
+        ]}]
+    )
+    return parse_claude_json(raw), raw
+
+
+def extract_pdf_json(api_client: 'anthropic.Anthropic', file_bytes: bytes) -> Dict:
+    """Run a route sheet PDF's text through Claude. Raises on failure."""
+    text = pdf_text(file_bytes)
+    if not text.strip():
+        raise ExtractionError("PDF has no extractable text — try uploading a photo instead.")
+    raw = create_message_with_retry(api_client, model=CLAUDE_MODEL, max_tokens=4096,
+                                    messages=[{"role": "user", "content": PDF_PROMPT + text}])
+    return parse_claude_json(raw)
+
+
+def extract_route_sheet(api_client: 'anthropic.Anthropic', file_bytes: bytes, filename: str,
+                        use_templates: bool = True) -> Dict:
+    """Extract route JSON from an uploaded sheet, picking the extractor by file extension.
+
+    A byte-identical sheet is served from the extraction cache before anything else; otherwise a
+    confidently matching stored route template is returned without calling Claude unless
+    ``use_templates`` is False. Safe to call from worker threads: never touches Streamlit,
+    raises on failure.
+    """
+    ext = filename.split('.')[-1].lower()
+    cache_key = ExtractionCache.make_key(file_bytes, PDF_PROMPT if ext == 'pdf' else IMAGE_PROMPT)
+    cached = extraction_cache.get(cache_key) if extraction_cache else None
+    if cached is not None:
+        return cached
+    # Only a cache miss pays for the fingerprint's OCR / PDF parse
+    fingerprint = sheet_fingerprint(file_bytes, filename)
+    if use_templates:
+        template_json = lookup_route_template(fingerprint)
+        if template_json:
+            return template_json
+    if ext == 'pdf':
+        claude_json = extract_pdf_json(api_client, file_bytes)
+    else:
+        claude_json, _ = extract_image_json(api_client, file_bytes, MEDIA_MAP.get(ext, 'image/jpeg'))
+    if extraction_cache and claude_json.get('itsas'):
+        extraction_cache.put(cache_key, claude_json)
+    remember_route_template(fingerprint, claude_json)
+    return claude_json
+
@@ -0,0 +1,263 @@
+"""Offline street centerlines: snap GPS pings to block segments and measure how much of a block was driven."""
+import heapq
+import json
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .gps import CoverageIndex, StreetIndex, _union_length, normalize_street, normalize_streets, project_lonlat
+
+# ─── STREET GEOMETRY (OFFLINE) ─────────────────────────────────────────────────
+
+GEOMETRY_CELL_METERS = 100.0   # spatial grid cell size
+SNAP_MAX_METERS = 25.0         # pings further than this from every centerline stay unsnapped
+PING_PAD_METERS = 15.0         # stretch of segment each snapped ping vouches for either side of it
+
+
+def _centerline_name_key(keys) -> Optional[str]:
+    keys = [str(k) for k in keys]
+    return (next((k for k in keys if 'street' in k.lower()), None)
+            or next((k for k in keys if k.lower() in ('name', 'stname', 'st_name')), None))
+
+
+def _wkt_lines(wkt: str) -> List[List[tuple]]:
+    """LINESTRING / MULTILINESTRING WKT → one list of (lon, lat) per line."""
+    return [[tuple(float(v) for v in point.split()[:2]) for point in part.split(',')]
+            for part in re.findall(r'\(([^()]+)\)', str(wkt))]
+
+
+def read_centerlines(path: str) -> List[tuple[str, List[tuple]]]:
+    """(street name, [(lon, lat), ...]) per centerline line from a GeoJSON or a CSV with WKT geometry.
+
+    LION-style exports work as-is: each feature is one block of one street between intersections.
+    """
+    lines = []
+    if path.lower().endswith(('.geojson', '.json')):
+        with open(path) as f:
+            features = json.load(f).get('features', [])
+        for feature in features:
+            props = feature.get('properties') or {}
+            key = _centerline_name_key(props)
+            geom = feature.get('geometry') or {}
+            coords = geom.get('coordinates') or []
+            parts = [coords] if geom.get('type') == 'LineString' else coords if geom.get('type') == 'MultiLineString' else []
+            lines.extend((str(props.get(key) or '') if key else '', [tuple(p[:2]) for p in part]) for part in parts)
+        return lines
+    df = pd.read_csv(path, dtype=str)
+    name_col = _centerline_name_key(df.columns)
+    geom_col = next((c for c in df.columns if 'geom' in c.lower() or c.lower() == 'wkt'), None)
+    if geom_col is None:
+        raise ValueError(f"No WKT geometry column in {path}")
+    names = df[name_col].fillna('') if name_col else pd.Series('', index=df.index)
+    for name, wkt in zip(names.tolist(), df[geom_col].fillna('').tolist()):
+        lines.extend((name, part) for part in _wkt_lines(wkt))
+    return lines
+
+
+class StreetGeometry:
+    """Street centerlines projected to metres, with a uniform grid over their segments.
+
+    Each centerline feature is a polyline; its straight pieces are the segments pings snap to.
+    Features are joined into a graph at shared endpoints, so an ITSA's block is the path along
+    its street between the nodes it shares with the two cross streets.
+    """
+
+    def __init__(self, lines: List[tuple[str, List[tuple]]]):
+        self.names: List[str] = []
+        self.lengths: List[float] = []
+        self.ends: List[tuple[int, int]] = []
+        nodes: Dict[tuple[int, int], int] = {}
+        seg_a, seg_b, seg_feature, seg_offset = [], [], [], []
+        for name, points in lines:
+            pts = np.array(points, dtype=float)
+            if pts.ndim != 2 or len(pts) < 2 or np.isnan(pts).any():
+                continue
+            x, y = project_lonlat(pts[:, 0], pts[:, 1])
+            xy = np.column_stack([x, y])
+            piece = np.hypot(*np.diff(xy, axis=0).T)
+            keep = piece > 0
+            if not keep.any():
+                continue
+            feature = len(self.names)
+            offsets = np.concatenate([[0.0], np.cumsum(piece)])[:-1]
+            seg_a.append(xy[:-1][keep])
+            seg_b.append(xy[1:][keep])
+            seg_offset.append(offsets[keep])
+            seg_feature.append(np.full(int(keep.sum()), feature))
+            self.names.append(str(name))
+            self.lengths.append(float(piece.sum()))
+            # Endpoints rounded to the metre become graph nodes shared with touching features
+            self.ends.append(tuple(nodes.setdefault((round(px), round(py)), len(nodes))
+                                   for px, py in (xy[0], xy[-1])))
+        self.names = list(normalize_streets(self.names)) if self.names else []
+        self.node_count = len(nodes)
+        if seg_a:
+            a, b = np.concatenate(seg_a), np.concatenate(seg_b)
+        else:
+            a = b = np.empty((0, 2))
+        self.ax, self.ay = a[:, 0], a[:, 1]
+        self.dx, self.dy = b[:, 0] - a[:, 0], b[:, 1] - a[:, 1]
+        self.seg_len = np.hypot(self.dx, self.dy)
+        self.seg_feature = np.concatenate(seg_feature) if seg_feature else np.empty(0, dtype=int)
+        self.seg_offset = np.concatenate(seg_offset) if seg_offset else np.empty(0)
+        self.cells = self._build_grid(a, b)
+        self.name_index = StreetIndex(set(self.names) - {''})
+        self._by_name: Dict[str, List[int]] = {}
+        for feature, name in enumerate(self.names):
+            self._by_name.setdefault(name, []).append(feature)
+        self._blocks: Dict[tuple, Optional[List[int]]] = {}
+
+    @staticmethod
+    def _build_grid(a: np.ndarray, b: np.ndarray) -> Dict[tuple[int, int], np.ndarray]:
+        """Register each segment in every cell its bbox (grown by the snap radius) touches.
+
+        A ping then only needs the segments listed under its own cell.
+        """
+        lo = np.floor((np.minimum(a, b) - SNAP_MAX_METERS) / GEOMETRY_CELL_METERS).astype(int)
+        hi = np.floor((np.maximum(a, b) + SNAP_MAX_METERS) / GEOMETRY_CELL_METERS).astype(int)
+        cells: Dict[tuple[int, int], List[int]] = {}
+        for seg, (x0, y0, x1, y1) in enumerate(np.column_stack([lo, hi]).tolist()):
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    cells.setdefault((cx, cy), []).append(seg)
+        return {cell: np.array(segs) for cell, segs in cells.items()}
+
+    def snap(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Nearest feature per point (-1 when none is within SNAP_MAX_METERS) and metres along it.
+
+        Points are bucketed by grid cell; each cell is one broadcast points × candidate segments.
+        """
+        x, y = np.broadcast_to(np.asarray(x, dtype=float), np.shape(y)), np.asarray(y, dtype=float)
+        feature = np.full(len(x), -1)
+        position = np.full(len(x), np.nan)
+        idx = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        if not len(idx) or not self.cells:
+            return feature, position
+        cx = np.floor(x[idx] / GEOMETRY_CELL_METERS).astype(np.int64)
+        cy = np.floor(y[idx] / GEOMETRY_CELL_METERS).astype(np.int64)
+        cell_key = (cx - cx.min()) * (int(cy.max() - cy.min()) + 1) + (cy - cy.min())
+        order = np.argsort(cell_key, kind='stable')
+        sorted_keys = cell_key[order]
+        bounds = np.flatnonzero(np.diff(sorted_keys)) + 1
+        for members in np.split(order, bounds):
+            segs = self.cells.get((int(cx[members[0]]), int(cy[members[0]])))
+            if segs is None:
+                continue
+            pts = idx[members]
+            px, py = x[pts][:, None], y[pts][:, None]
+            ax, ay, dx, dy = self.ax[segs], self.ay[segs], self.dx[segs], self.dy[segs]
+            t = np.clip(((px - ax) * dx + (py - ay) * dy) / self.seg_len[segs] ** 2, 0.0, 1.0)
+            d2 = (ax + t * dx - px) ** 2 + (ay + t * dy - py) ** 2
+            best = d2.argmin(axis=1)
+            rows = np.arange(len(pts))
+            near = d2[rows, best] <= SNAP_MAX_METERS ** 2
+            chosen = segs[best[near]]
+            feature[pts[near]] = self.seg_feature[chosen]
+            position[pts[near]] = self.seg_offset[chosen] + t[rows, best][near] * self.seg_len[chosen]
+        return feature, position
+
+    def snap_pings(self, units: np.ndarray, x: np.ndarray, y: np.ndarray, order) -> pd.DataFrame:
+        """Snap these pings and collapse them into per-unit feature runs (see ``_collapse_feature_runs``).
+
+        ``order`` is each ping's time, or its row in the file when there are no timestamps.
+        Unsnapped pings are kept as feature -1 runs so they still split runs across chunks.
+        """
+        feature, position = self.snap(x, y)
+        pings = pd.DataFrame({'unit': units, 'feature': feature, 'start': order,
+                              'lo': position, 'hi': position}).dropna(subset=['unit', 'start'])
+        return _collapse_feature_runs(pings)
+
+    def driven_intervals(self, parts: List[pd.DataFrame]) -> Dict[str, Dict[int, List[tuple[float, float]]]]:
+        """Stitch ``snap_pings`` results from every chunk into unit → feature → driven (lo, hi) stretches."""
+        runs = _collapse_feature_runs(pd.concat(parts, ignore_index=True))
+        runs = runs[runs['feature'] >= 0]
+        visited: Dict[str, Dict[int, List[tuple[float, float]]]] = {}
+        for unit, feature, lo, hi in zip(runs['unit'], runs['feature'].tolist(), runs['lo'].tolist(), runs['hi'].tolist()):
+            visited.setdefault(unit, {}).setdefault(feature, []).append((lo, hi))
+        return visited
+
+    def _features(self, norm_street: str) -> List[int]:
+        return [f for name in self.name_index.lookup(norm_street) for f in self._by_name[name]]
+
+    def block(self, norm_street: str, norm_from: str, norm_to: str) -> Optional[List[int]]:
+        """Features of the street between its From and To cross streets (shortest path), if found."""
+        key = (norm_street, norm_from, norm_to)
+        if key not in self._blocks:
+            self._blocks[key] = self._find_block(*key)
+        return self._blocks[key]
+
+    def _find_block(self, norm_street: str, norm_from: str, norm_to: str) -> Optional[List[int]]:
+        adjacency: Dict[int, List[tuple[int, int]]] = {}
+        for f in self._features(norm_street):
+            u, v = self.ends[f]
+            adjacency.setdefault(u, []).append((v, f))
+            adjacency.setdefault(v, []).append((u, f))
+        from_nodes = {n for f in self._features(norm_from) for n in self.ends[f]} & adjacency.keys()
+        to_nodes = {n for f in self._features(norm_to) for n in self.ends[f]} & adjacency.keys()
+        if not from_nodes or not to_nodes or from_nodes & to_nodes:
+            return None
+        # Multi-source Dijkstra along the street from every From corner to the nearest To corner
+        dist = {n: 0.0 for n in from_nodes}
+        back: Dict[int, tuple[int, int]] = {}
+        heap = [(0.0, n) for n in from_nodes]
+        heapq.heapify(heap)
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node]:
+                continue
+            if node in to_nodes:
+                path = []
+                while node in back:
+                    node, f = back[node]
+                    path.append(f)
+                return path
+            for nxt, f in adjacency[node]:
+                nd = d + self.lengths[f]
+                if nd < dist.get(nxt, float('inf')):
+                    dist[nxt], back[nxt] = nd, (node, f)
+                    heapq.heappush(heap, (nd, nxt))
+        return None
+
+
+def _collapse_feature_runs(pings: pd.DataFrame) -> pd.DataFrame:
+    """Merge consecutive same-feature rows per unit (in ``start`` order) into runs spanning lo..hi.
+
+    Like ``gps._collapse_runs``: a truck that only touches both ends of a segment leaves two short
+    runs, not one covering the whole segment. Rows may be pings or runs from earlier chunks.
+    """
+    pings = pings.sort_values(['unit', 'start'], kind='stable')
+    new_run = (pings['unit'] != pings['unit'].shift()) | (pings['feature'] != pings['feature'].shift())
+    return pings.groupby(new_run.cumsum()).agg(
+        unit=('unit', 'first'), feature=('feature', 'first'), start=('start', 'min'),
+        lo=('lo', 'min'), hi=('hi', 'max')).reset_index(drop=True)
+
+
+class SegmentCoverage:
+    """One truck's driven stretches of each snapped feature, answered the same way as CoverageIndex.
+
+    Blocks the geometry can't resolve fall back to ``fallback`` (the truck's ping runs).
+    """
+
+    def __init__(self, geometry: StreetGeometry, visited: Dict[int, List[tuple[float, float]]],
+                 fallback: Optional[CoverageIndex] = None):
+        self.geometry = geometry
+        self.visited = visited
+        self.fallback = fallback
+
+    def coverage(self, street: str, from_cross: str, to_cross: str) -> Optional[float]:
+        norm_from, norm_to = normalize_street(str(from_cross or '')), normalize_street(str(to_cross or ''))
+        block = None
+        if norm_from and norm_to:
+            block = self.geometry.block(normalize_street(street), norm_from, norm_to)
+        if not block:
+            return self.fallback.coverage(street, from_cross, to_cross) if self.fallback else None
+        total = sum(self.geometry.lengths[f] for f in block)
+        covered = 0.0
+        for f in block:
+            length = self.geometry.lengths[f]
+            covered += _union_length([(max(0.0, lo - PING_PAD_METERS), min(length, hi + PING_PAD_METERS))
+                                      for lo, hi in self.visited.get(f, ())])
+        return min(1.0, covered / total)
+
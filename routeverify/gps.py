@@ -0,0 +1,650 @@
+"""Rastrac GPS exports → visited streets and driven blocks, and ITSA verification against them."""
+import re
+import uuid
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from .geometry import StreetGeometry
+
+# ─── GPS PARSING ───────────────────────────────────────────────────────────────
+
+GPS_CHUNK_ROWS = 100_000
+
+STREET_SUFFIXES = {'AVENUE': 'AVE', 'STREET': 'ST', 'BOULEVARD': 'BLVD', 'DRIVE': 'DR', 'COURT': 'CT',
+                   'PLACE': 'PL', 'ROAD': 'RD', 'LANE': 'LN', 'TERRACE': 'TER', 'HIGHWAY': 'HWY', 'PARKWAY': 'PKWY'}
+_STREET_SUFFIX_RE = re.compile(r'\b(' + '|'.join(STREET_SUFFIXES) + r')\b')
+_HOUSE_NUMBER_RE = re.compile(r'^\d+\s+')
+_ASCII_HOUSE_NUMBER = r'^[0-9]+[\t\n\x0b\f\r\x1c-\x1f ]+'  # _HOUSE_NUMBER_RE for ASCII text, spelled out for RE2
+
+
+def _abbreviate_suffix(m: re.Match) -> str:
+    return STREET_SUFFIXES[m.group(1)]
+
+
+def find_address_column(columns) -> Optional[str]:
+    return next((c for c in columns if 'addr' in c.lower() or c.lower() == 'address'), None)
+
+
+UNIT_COLUMN_HINTS = ('vehicle', 'unit', 'truck', 'asset', 'device')
+
+
+def find_unit_column(columns) -> Optional[str]:
+    return next((c for c in columns if any(hint in c.lower() for hint in UNIT_COLUMN_HINTS)), None)
+
+
+def find_time_column(columns) -> Optional[str]:
+    return (next((c for c in columns if 'time' in c.lower()), None)
+            or next((c for c in columns if 'date' in c.lower()), None))
+
+
+def find_coordinate_columns(columns) -> tuple[Optional[str], Optional[str]]:
+    lat_col = next((c for c in columns if c.lower().startswith('lat')), None)
+    lon_col = next((c for c in columns if c.lower().startswith(('lon', 'lng'))), None)
+    return lat_col, lon_col
+
+
+def unit_key(name) -> str:
+    """Canonical truck id for matching: '24dp 421' and '24DP-421' → '24DP421'."""
+    return re.sub(r'[^A-Z0-9]', '', str(name).upper())
+
+
+def name_unit_keys(name) -> set:
+    """Every unit_key a filename could spell with whole words, e.g. '24DP-421_2.jpg' → 24DP421, 421, 2, ...
+
+    Words are joined only within one '_' / '.' separated field of the name, since '-' and spaces
+    can sit inside a truck id but '_' separates the id from whatever follows.
+    """
+    keys = set()
+    for field in re.split(r'[_.]', str(name).upper()):
+        words = re.findall(r'[A-Z0-9]+', field)
+        keys.update(''.join(words[i:j]) for i in range(len(words)) for j in range(i + 1, len(words) + 1))
+    return keys
+
+
+def street_from_address(addr) -> str:
+    """'123 MAIN ST, NEW YORK, NY' → 'MAIN ST'."""
+    parts = str(addr).strip().split(',')
+    return _HOUSE_NUMBER_RE.sub('', parts[0].strip()).strip().upper()
+
+
+def streets_from_addresses(addresses: pd.Series) -> pd.Series:
+    """Vectorized street_from_address over a column of raw addresses (NaNs dropped).
+
+    Patterns are plain strings so pandas can run them as Arrow kernels on Arrow-backed columns.
+    Those kernels only know ASCII digits, whitespace and case rules, so the (rare) non-ASCII
+    addresses go through street_from_address itself.
+    """
+    addresses = addresses.dropna().astype(str)
+    first_part = addresses.str.replace(r'(?s),.*', '', regex=True).str.strip()
+    streets = first_part.str.replace(_ASCII_HOUSE_NUMBER, '', regex=True).str.strip().str.upper()
+    non_ascii = ~addresses.str.isascii().to_numpy(dtype=bool)
+    if non_ascii.any():
+        streets = streets.astype(object)
+        streets[non_ascii] = [street_from_address(a) for a in addresses[non_ascii]]
+    return streets
+
+
+def _unique_streets(addresses: pd.Series) -> set:
+    streets = streets_from_addresses(pd.Series(addresses.dropna().unique()))
+    return set(streets.unique()) - {''}
+
+
+def parse_rastrac_csv(gps_df: pd.DataFrame) -> set:
+    addr_col = find_address_column(gps_df.columns)
+    if not addr_col:
+        return set()
+    return _unique_streets(gps_df[addr_col])
+
+
+RUN_AGGREGATES = {'start': 'min', 'end': 'max', 'house_min': 'min', 'house_max': 'max'}
+RUN_FIRST = ['unit', 'street', 'house_first', 'x_first', 'y_first']  # taken from a run's first ping
+RUN_LAST = ['house_last', 'x_last', 'y_last']                          # ... and from its last, even if NaN
+
+
+PROJECTION_ORIGIN = (40.7128, -74.0060)  # (lat, lon) of City Hall; the plane is true to scale around it
+
+
+def _metres_per_degree(lat: float) -> tuple[float, float]:
+    """(east-west, north-south) metres per degree at ``lat`` on the WGS84 ellipsoid."""
+    phi = np.radians(lat)
+    return (111_412.84 * np.cos(phi) - 93.5 * np.cos(3 * phi),
+            111_132.92 - 559.82 * np.cos(2 * phi) + 1.175 * np.cos(4 * phi))
+
+
+_M_PER_DEG_LON, _M_PER_DEG_LAT = _metres_per_degree(PROJECTION_ORIGIN[0])
+
+
+def project_lonlat(lon: np.ndarray, lat: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Metres east and north of PROJECTION_ORIGIN, one fixed scale per axis.
+
+    Within the five boroughs distances come out within about 0.5% of great-circle ones; pings
+    and centerlines must go through the same projection since only their differences are used.
+    """
+    lat0, lon0 = PROJECTION_ORIGIN
+    x = (np.asarray(lon, dtype=float) - lon0) * _M_PER_DEG_LON
+    y = (np.asarray(lat, dtype=float) - lat0) * _M_PER_DEG_LAT
+    return x, y
+
+
+def _planar_xy(lat: pd.Series, lon: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    lat = pd.to_numeric(lat, errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(lon, errors='coerce').to_numpy(dtype=float)
+    return project_lonlat(lon, lat)
+
+
+def _unit_keys(raw_units: pd.Series, gps: 'RastracGps') -> np.ndarray:
+    """unit_key per ping (None where the unit is missing), recording display labels on ``gps``."""
+    unit_codes, uniques = pd.factorize(raw_units)
+    keys = [unit_key(u) for u in uniques]
+    for key, raw in zip(keys, uniques):
+        gps.unit_labels.setdefault(key, str(raw).strip())
+    # Code -1 (missing unit) picks the trailing None
+    return np.array(keys + [None], dtype=object)[unit_codes]
+
+
+def _collapse_runs(pings: pd.DataFrame) -> pd.DataFrame:
+    """Merge consecutive same-street rows per unit (in time order) into runs.
+
+    Rows may be single pings or runs from earlier chunks; the result has the same columns.
+    """
+    pings = pings.sort_values(['unit', 'start'], kind='stable')
+    new_run = (pings['unit'] != pings['unit'].shift()) | (pings['street'] != pings['street'].shift())
+    runs = pings.groupby(new_run.cumsum()).agg(RUN_AGGREGATES).reset_index(drop=True)
+    # Runs are contiguous after the sort, so their first and last rows are found by position;
+    # groupby's 'first'/'last' would skip a missing house number or coordinate
+    firsts = np.flatnonzero(new_run.to_numpy())
+    lasts = np.append(firsts[1:], len(pings))[:len(firsts)] - 1
+    for col in RUN_FIRST:
+        runs[col] = pings[col].to_numpy()[firsts]
+    for col in RUN_LAST:
+        runs[col] = pings[col].to_numpy()[lasts]
+    return runs[pings.columns]
+
+
+def load_rastrac_gps(gps_file, chunksize: int = GPS_CHUNK_ROWS,
+                     geometry: Optional['StreetGeometry'] = None) -> 'RastracGps':
+    """Stream a Rastrac CSV (path or upload) into fleet-wide and per-truck visited street sets.
+
+    Only the address, vehicle/unit, timestamp and lat/lon columns are read, ``chunksize`` rows at
+    a time. Streets are parsed once per distinct address and grouped by unit in the same pass.
+    When pings carry timestamps they are also collapsed into per-truck street runs for
+    segment-level coverage, so peak memory is one chunk plus the street sets and runs.
+    With a StreetGeometry, pings with lat/lon are also snapped to centerline segments and the
+    stretches each truck drove along them are kept; addresses are then optional.
+    """
+    header = pd.read_csv(gps_file, nrows=0)
+    addr_col = find_address_column(header.columns)
+    unit_col = find_unit_column(header.columns)
+    time_col = find_time_column(header.columns)
+    lat_col, lon_col = find_coordinate_columns(header.columns)
+    has_coords = bool(lat_col and lon_col)
+    gps = RastracGps()
+    if not addr_col and not (geometry is not None and has_coords):
+        return gps
+    if hasattr(gps_file, 'seek'):
+        gps_file.seek(0)
+    usecols = [c for c in dict.fromkeys((addr_col, unit_col, time_col, lat_col, lon_col)) if c]
+    run_parts, segment_parts = [], []
+    for chunk in pd.read_csv(gps_file, usecols=usecols, dtype=str, chunksize=chunksize):
+        units = _unit_keys(chunk[unit_col], gps) if unit_col else np.full(len(chunk), '', dtype=object)
+        x, y = _planar_xy(chunk[lat_col], chunk[lon_col]) if has_coords else (np.nan, np.nan)
+        start = pd.to_datetime(chunk[time_col], errors='coerce') if time_col else None
+        if geometry is not None and has_coords:
+            order = start if time_col else chunk.index.to_series()
+            segment_parts.append(geometry.snap_pings(units, x, y, order.to_numpy()))
+        if not addr_col:
+            continue
+        keep = chunk[addr_col].notna().to_numpy()
+        chunk, units = chunk[keep], units[keep]
+        if time_col:
+            start = start[keep]
+        if has_coords:
+            x, y = x[keep], y[keep]
+        # Parse each distinct address once, then broadcast back to pings by factorized code
+        codes, addresses = pd.factorize(chunk[addr_col])
+        addresses = pd.Series(addresses)
+        streets = streets_from_addresses(addresses)
+        street_codes, unique_streets = pd.factorize(streets)
+        gps.streets |= set(unique_streets) - {''}
+        ping_streets = streets.to_numpy(dtype=object)[codes]
+        if unit_col:
+            pairs = pd.DataFrame({'unit': units, 'street': ping_streets}).dropna().drop_duplicates()
+            for unit, unit_streets in pairs.groupby('unit')['street']:
+                gps.by_unit.setdefault(unit, set()).update(set(unit_streets) - {''})
+        if time_col:
+            house = pd.to_numeric(addresses.str.extract(r'^\s*(\d+)', expand=False), errors='coerce')
+            house = house.to_numpy(dtype=float)[codes]
+            norm_streets = normalize_streets(list(unique_streets)).to_numpy(dtype=object)[street_codes][codes]
+            pings = pd.DataFrame({
+                'unit': units, 'street': norm_streets, 'start': start, 'end': start,
+                'house_first': house, 'house_last': house, 'house_min': house, 'house_max': house,
+                'x_first': x, 'y_first': y, 'x_last': x, 'y_last': y,
+            }, index=chunk.index).dropna(subset=['unit', 'street', 'start'])
+            run_parts.append(_collapse_runs(pings[pings['street'] != '']))
+    if segment_parts:
+        gps.geometry = geometry
+        for unit, unit_visited in geometry.driven_intervals(segment_parts).items():
+            gps.segments[unit] = unit_visited
+            # Snapped segment names stand in for addresses in the name-match fallback
+            names = {geometry.names[f] for f in unit_visited} - {''}
+            gps.streets |= names
+            gps.by_unit.setdefault(unit, set()).update(names)
+    gps.by_unit.pop('', None)
+    if run_parts:
+        # Runs split across chunk boundaries (or unsorted files) are stitched back together here
+        runs = _collapse_runs(pd.concat(run_parts, ignore_index=True))
+        for unit, unit_runs in runs.groupby('unit', sort=False):
+            gps.coverage[unit] = CoverageIndex(unit_runs)
+    return gps
+
+
+def normalize_street(name: str) -> str:
+    name = name.upper().strip()
+    return _STREET_SUFFIX_RE.sub(_abbreviate_suffix, name).strip()
+
+
+def normalize_streets(names) -> pd.Series:
+    """Vectorized normalize_street; each distinct name is normalized once and mapped back."""
+    names = pd.Series(names, dtype=object)
+    uniques = pd.Series(names.unique(), dtype=object)
+    normalized = uniques.str.upper().str.strip().str.replace(_STREET_SUFFIX_RE, _abbreviate_suffix, regex=True).str.strip()
+    return names.map(dict(zip(uniques, normalized)))
+
+
+def streets_match(norm_street: str, other: str) -> bool:
+    """Same street if the normalized names are equal or share at least min(2, n) words."""
+    if norm_street == other:
+        return True
+    words = set(norm_street.split())
+    return len(words & set(other.split())) >= min(2, len(words))
+
+
+class StreetIndex:
+    """Normalized visited streets plus a token → street posting list, built once per GPS file.
+
+    Answers the streets_match rule against every visited street with posting-list lookups
+    instead of re-tokenizing every visited street for every ITSA.
+    """
+
+    def __init__(self, streets_visited: set):
+        self.streets = set(normalize_streets(list(streets_visited)))
+        self._names = list(self.streets)
+        self.postings: Dict[str, List[int]] = {}
+        for street_id, street in enumerate(self._names):
+            for token in set(street.split()):
+                self.postings.setdefault(token, []).append(street_id)
+
+    def matches(self, norm_street: str) -> bool:
+        if norm_street in self.streets:
+            return True
+        words = set(norm_street.split())
+        if len(words) == 0:
+            return bool(self.streets)
+        if len(words) == 1:
+            return next(iter(words)) in self.postings
+        shared: Dict[int, int] = {}
+        for word in words:
+            for street_id in self.postings.get(word, ()):
+                shared[street_id] = shared.get(street_id, 0) + 1
+                if shared[street_id] >= 2:
+                    return True
+        return False
+
+    def lookup(self, norm_street: str) -> List[str]:
+        """The exact street if indexed, otherwise every street streets_match would accept.
+
+        A blank name finds nothing here (streets_match would accept every street), so an ITSA
+        without a street never resolves to block geometry.
+        """
+        if norm_street in self.streets:
+            return [norm_street]
+        words = set(norm_street.split())
+        if not words:
+            return []
+        shared: Dict[int, int] = {}
+        for word in words:
+            for street_id in self.postings.get(word, ()):
+                shared[street_id] = shared.get(street_id, 0) + 1
+        need = min(2, len(words))
+        return [self._names[street_id] for street_id, n in shared.items() if n >= need]
+
+
+COVERAGE_DONE_PCT = 80.0       # share of the block that must be driven for an ITSA to count as done
+COVERAGE_MIN_BLOCK_METERS = 20.0
+COVERAGE_MAX_TURN_SECONDS = 300.0  # a longer silence between two runs (a break, lost signal) isn't a turn
+COVERAGE_MAX_TURN_METERS = 150.0   # ... nor, for runs without times, a jump this far
+# Block length assumed when only one corner of the block was seen: longer than most street blocks,
+# so a truck that turned off partway stays under COVERAGE_DONE_PCT, while one that drove straight
+# through the far corner (no turn, so no anchor there) still reaches it
+COVERAGE_ONE_CORNER_HOUSES = 100.0
+COVERAGE_ONE_CORNER_METERS = 160.0
+
+
+def _union_length(intervals: List[tuple[float, float]]) -> float:
+    total, cur_lo, cur_hi = 0.0, None, None
+    for lo, hi in sorted(intervals):
+        if cur_hi is None or lo > cur_hi:
+            if cur_hi is not None:
+                total += cur_hi - cur_lo
+            cur_lo, cur_hi = lo, hi
+        else:
+            cur_hi = max(cur_hi, hi)
+    if cur_hi is not None:
+        total += cur_hi - cur_lo
+    return total
+
+
+def _reach(intervals: List[tuple[float, float]], origin: float) -> float:
+    """How far the union of ``intervals`` runs on without a gap from ``origin``, in either direction."""
+    best = 0.0
+    for sign in (1.0, -1.0):
+        cur = 0.0
+        for lo, hi in sorted(tuple(sorted(((lo - origin) * sign, (hi - origin) * sign))) for lo, hi in intervals):
+            if lo > cur:
+                break
+            cur = max(cur, hi)
+        best = max(best, cur)
+    return best
+
+
+def _turns(runs: pd.DataFrame) -> List[bool]:
+    """Per run, whether it follows straight on from the previous one (the truck turned a corner).
+
+    Judged on the time gap when both runs have times, else on the distance between the previous
+    run's last ping and this run's first; with neither, consecutive runs are taken as a turn.
+    """
+    if len(runs) == 0:
+        return []
+    start = runs['start'].to_numpy(dtype='datetime64[ns]')
+    end = runs['end'].to_numpy(dtype='datetime64[ns]')
+    gap_seconds = (start[1:] - end[:-1]) / np.timedelta64(1, 's')
+    jump = np.hypot(runs['x_first'].to_numpy(dtype=float)[1:] - runs['x_last'].to_numpy(dtype=float)[:-1],
+                    runs['y_first'].to_numpy(dtype=float)[1:] - runs['y_last'].to_numpy(dtype=float)[:-1])
+    turned = np.where(np.isnan(gap_seconds), ~(jump > COVERAGE_MAX_TURN_METERS),
+                      gap_seconds <= COVERAGE_MAX_TURN_SECONDS)
+    return [False] + turned.tolist()
+
+
+class CoverageIndex:
+    """One truck's time-ordered street runs, swept once into corner anchors and per-street spans.
+
+    A run is a stretch of consecutive pings on one street. Where the truck turns from street X
+    onto street Y, the end of the X run marks where X meets Y and the start of the Y run marks
+    the same corner on Y. An ITSA's block is the stretch of its street between the anchors for
+    its two cross streets, measured in house numbers, or in metres along the street when the
+    addresses carry no numbers but pings have lat/lon. Runs separated by a long time gap (or,
+    without times, a long jump) are not treated as a turn.
+    """
+
+    def __init__(self, runs: pd.DataFrame):
+        self.spans: Dict[str, List[tuple]] = {}
+        self.anchors: Dict[str, Dict[str, List[tuple]]] = {}
+        firsts = zip(*(runs[c].tolist() for c in ('house_first', 'x_first', 'y_first')))
+        lasts = zip(*(runs[c].tolist() for c in ('house_last', 'x_last', 'y_last')))
+        prev_street, prev_last = None, None
+        for street, mn, mx, first, last, turned in zip(runs['street'].tolist(), runs['house_min'].tolist(),
+                                                       runs['house_max'].tolist(), firsts, lasts, _turns(runs)):
+            self.spans.setdefault(street, []).append((mn, mx, first, last))
+            if turned:
+                self.anchors.setdefault(prev_street, {}).setdefault(street, []).append(prev_last)
+                self.anchors.setdefault(street, {}).setdefault(prev_street, []).append(first)
+            prev_street, prev_last = street, last
+
+    def _corner(self, streets: List[str], norm_cross: str) -> List[tuple]:
+        return [pos for street in streets for cross, positions in self.anchors.get(street, {}).items()
+                if streets_match(norm_cross, cross) for pos in positions]
+
+    def coverage(self, street: str, from_cross: str, to_cross: str) -> Optional[float]:
+        """Fraction of the From→To block driven, or None when neither of its corners was seen.
+
+        With only one corner seen, the truck either turned off partway or drove straight through
+        the other corner; the stretch driven on from the seen corner is measured against a long
+        nominal block (COVERAGE_ONE_CORNER_*) rather than trusting the street name.
+        """
+        norm_street = normalize_street(street)
+        norm_from, norm_to = normalize_street(str(from_cross or '')), normalize_street(str(to_cross or ''))
+        if not norm_street or not norm_from or not norm_to:
+            return None
+        streets = [s for s in self.spans if streets_match(norm_street, s)]
+        corner_a, corner_b = self._corner(streets, norm_from), self._corner(streets, norm_to)
+        if not corner_a and not corner_b:
+            return None
+        spans = [span for s in streets for span in self.spans[s]]
+        if not corner_a or not corner_b:
+            return self._one_corner_coverage(corner_a or corner_b, spans)
+
+        house_a = np.nanmedian([p[0] for p in corner_a]) if any(pd.notna(p[0]) for p in corner_a) else np.nan
+        house_b = np.nanmedian([p[0] for p in corner_b]) if any(pd.notna(p[0]) for p in corner_b) else np.nan
+        if pd.notna(house_a) and pd.notna(house_b) and house_a != house_b:
+            lo, hi = sorted((house_a, house_b))
+            covered = [(max(lo, mn), min(hi, mx)) for mn, mx, _, _ in spans
+                       if pd.notna(mn) and mx > lo and mn < hi]
+            return min(1.0, _union_length(covered) / (hi - lo))
+
+        pts_a = np.array([p[1:] for p in corner_a], dtype=float)
+        pts_b = np.array([p[1:] for p in corner_b], dtype=float)
+        if np.isnan(pts_a).all() or np.isnan(pts_b).all():
+            return None
+        a, b = np.nanmean(pts_a, axis=0), np.nanmean(pts_b, axis=0)
+        axis = b - a
+        length = float(np.hypot(*axis))
+        if length < COVERAGE_MIN_BLOCK_METERS:
+            return None
+        covered = []
+        for _, _, first, last in spans:
+            ends = np.array([first[1:], last[1:]], dtype=float)
+            if np.isnan(ends).any():
+                continue
+            t1, t2 = np.clip((ends - a) @ axis / length ** 2, 0.0, 1.0)
+            if t1 != t2:
+                covered.append((min(t1, t2), max(t1, t2)))
+        return min(1.0, _union_length(covered))
+
+    @staticmethod
+    def _one_corner_coverage(corner: List[tuple], spans: List[tuple]) -> float:
+        if any(pd.notna(p[0]) for p in corner):
+            house = np.nanmedian([p[0] for p in corner])
+            reach = _reach([(mn, mx) for mn, mx, _, _ in spans if pd.notna(mn)], house)
+            return min(1.0, reach / COVERAGE_ONE_CORNER_HOUSES)
+        pts = np.array([p[1:] for p in corner], dtype=float)
+        ends = np.array([[first[1:], last[1:]] for _, _, first, last in spans], dtype=float).reshape(-1, 2, 2)
+        ends = ends[~np.isnan(ends).any(axis=(1, 2))]
+        if np.isnan(pts).all() or not len(ends):
+            return 0.0
+        a = np.nanmean(pts, axis=0)
+        # Measure along the street, taken as pointing from the corner to the farthest ping
+        offsets = (ends - a).reshape(-1, 2)
+        far = offsets[np.hypot(*offsets.T).argmax()]
+        if not far.any():
+            return 0.0
+        t = (ends - a) @ (far / np.hypot(*far))
+        return min(1.0, _reach([tuple(pair) for pair in t.tolist()], 0.0) / COVERAGE_ONE_CORNER_METERS)
+
+
+class RastracGps:
+    """Streets visited in one Rastrac export, fleet-wide and partitioned per truck unit."""
+
+    def __init__(self, streets: Optional[set] = None):
+        self.id = uuid.uuid4().hex  # session files store each export once under this
+        self.streets = streets if streets is not None else set()
+        self.by_unit: Dict[str, set] = {}
+        self.unit_labels: Dict[str, str] = {}
+        self.coverage: Dict[str, CoverageIndex] = {}
+        self.geometry: Optional['StreetGeometry'] = None
+        self.segments: Dict[str, Dict[int, List[tuple[float, float]]]] = {}
+        self._indexes: Dict[Optional[str], StreetIndex] = {}
+
+    def unit_for(self, truck: str) -> Optional[str]:
+        key = unit_key(truck)
+        return key if key in self.by_unit else None
+
+    def unit_in_name(self, name: str) -> Optional[str]:
+        """Unit whose id appears in e.g. an upload filename like '24DP-421_M4.jpg'."""
+        name_keys = name_unit_keys(name)
+        hits = [unit for unit in self.by_unit if len(unit) >= 3 and unit in name_keys]
+        return max(hits, key=len) if hits else None
+
+    def streets_for(self, truck: str) -> tuple[set, StreetIndex]:
+        """The truck's own streets and index when it has a partition, else the whole fleet's."""
+        unit = self.unit_for(truck)
+        streets = self.by_unit[unit] if unit else self.streets
+        if unit not in self._indexes:
+            self._indexes[unit] = StreetIndex(streets)
+        return streets, self._indexes[unit]
+
+    def coverage_for(self, truck: str):
+        """Coverage source for the truck; an export without a unit column is treated as a single truck.
+
+        Snapped centerline segments win when loaded, falling back to the truck's ping runs.
+        """
+        unit = self.unit_for(truck)
+        if not unit:
+            if self.by_unit:
+                return None
+            unit = ''
+        runs = self.coverage.get(unit)
+        if self.geometry is not None and unit in self.segments:
+            from .geometry import SegmentCoverage
+            return SegmentCoverage(self.geometry, self.segments[unit], fallback=runs)
+        return runs
+
+
+def verify_itsas_against_gps(itsas: List[Dict], streets_visited, coverage=None) -> pd.DataFrame:
+    """Mark each ITSA DONE/SKIPPED; ``streets_visited`` is a street set or a prebuilt StreetIndex.
+
+    With a CoverageIndex or SegmentCoverage, ITSAs whose From/To block can be located (or one of
+    whose corners the truck turned at) are judged on the share of the block actually driven,
+    reported as "Coverage %"; only the rest fall back to name matching.
+    """
+    index = streets_visited if isinstance(streets_visited, StreetIndex) else StreetIndex(streets_visited)
+    rows = []
+    streets = [str(itsa.get('street', '')).strip() for itsa in itsas]
+    for itsa, street, norm_street in zip(itsas, streets, normalize_streets(streets)):
+        num = itsa.get('number', '?')
+        from_cross = itsa.get('from_cross', '')
+        to_cross = itsa.get('to_cross', '')
+        side = itsa.get('side', 'B')
+        covered = coverage.coverage(street, from_cross, to_cross) if coverage else None
+        if covered is not None:
+            coverage_pct = round(covered * 100, 1)
+            matched = coverage_pct >= COVERAGE_DONE_PCT
+        else:
+            coverage_pct = None
+            matched = index.matches(norm_street)
+        status = "✅ DONE" if matched else "❌ SKIPPED"
+        rows.append({"ITSA #": num, "Street": street, "From": from_cross, "To": to_cross, "Side": side,
+                     "Status": status, "Coverage %": coverage_pct})
+    return pd.DataFrame(rows)
+
+
+def set_gps_status(route: dict, df: pd.DataFrame) -> None:
+    """Attach a verification result to ``route``, reading its Status strings once.
+
+    Completion is kept as ``gps_done`` (bool per row) + ``gps_count`` + the manual override set,
+    so toggles and totals never go back to the DataFrame.
+    """
+    gps_done = df['Status'].str.contains('DONE').to_numpy(dtype=bool) if len(df) else np.zeros(0, dtype=bool)
+    route.update({
+        "df": df,
+        "gps_done": gps_done,
+        "gps_count": int(gps_done.sum()),
+        "itsa_rows": {str(num): i for i, num in enumerate(df['ITSA #'])} if len(df) else {},
+        "total": len(df),
+        "status_version": route.get('status_version', 0) + 1,
+    })
+    route['done'] = route['gps_count'] + len(route['manual_overrides'])
+    route['pct'] = round(route['done'] / route['total'] * 100, 1) if route['total'] > 0 else 0.0
+
+
+def apply_override(route: dict, itsa_num, value: bool) -> int:
+    """Mark (or unmark) one ITSA as manually done. O(1); returns the change in ``route['done']``."""
+    overrides = route['manual_overrides']
+    key = str(itsa_num)
+    if bool(value) == (key in overrides):
+        return 0
+    if value:
+        overrides[key] = True
+    else:
+        del overrides[key]
+    delta = 1 if value else -1
+    route['status_version'] = route.get('status_version', 0) + 1
+    route['done'] += delta
+    route['pct'] = round(route['done'] / route['total'] * 100, 1) if route['total'] > 0 else 0.0
+    return delta
+
+
+DETAIL_COLUMNS = ['ITSA #', 'Street', 'From', 'To', 'Side']
+
+
+def detail_frame(route: dict) -> tuple[pd.DataFrame, list]:
+    """ITSA breakdown as the detail view shows it, plus the (ITSA #, Street, From, To) rows GPS missed.
+
+    Built vectorially and kept on the route until its GPS result or overrides change.
+    """
+    cached = route.get('detail_frame')
+    if cached is not None and cached[0] == route.get('status_version'):
+        return cached[1], cached[2]
+    df = route['df']
+    gps_done = route['gps_done']
+    frame = df.reindex(columns=DETAIL_COLUMNS + ['Coverage %'])
+    manual = frame['ITSA #'].astype(str).isin(route['manual_overrides']).to_numpy(dtype=bool)
+    frame.insert(len(DETAIL_COLUMNS), 'Status', np.where(gps_done, '✅ GPS', np.where(manual, '✅ MANUAL', '❌ SKIPPED')))
+    skipped = frame.loc[~gps_done, ['ITSA #', 'Street', 'From', 'To']].values.tolist()
+    route['detail_frame'] = (route.get('status_version'), frame, skipped)
+    return frame, skipped
+
+
+def build_route_entry(truck: str, route: str, claude_json: Dict, gps,
+                      sheet: Optional[tuple[str, bytes]] = None) -> dict:
+    """Verify a route's ITSAs against GPS and wrap everything the dashboard needs.
+
+    ``gps`` is a RastracGps (or a plain street set). When the export is partitioned by
+    vehicle and ``truck`` matches a unit, only that truck's streets count.
+    Routes filled from a stored template keep their (filename, bytes) ``sheet`` so they can be re-extracted.
+    """
+    if not isinstance(gps, RastracGps):
+        gps = RastracGps(set(gps))
+    gps_streets, index = gps.streets_for(truck)
+    df = verify_itsas_against_gps(claude_json.get('itsas', []), index, gps.coverage_for(truck))
+    entry = {
+        "id": uuid.uuid4().hex,
+        "truck": truck,
+        "route": route,
+        "claude_json": claude_json,
+        "gps_streets": gps_streets,
+        "gps": gps,
+        "gps_unit": gps.unit_for(truck),
+        "workers": "",
+        "shift_start": "",
+        "shift_end": "",
+        "notes": "",
+        "manual_overrides": {},
+        "sheet": sheet if claude_json.get('template_match') is not None else None,
+    }
+    set_gps_status(entry, df)
+    return entry
+
+
+def reverify_for_truck(route: dict) -> bool:
+    """Re-run GPS verification when a truck # edit points the route at a different unit's pings.
+
+    Manual overrides are kept for ITSAs that are still skipped. Returns True if anything changed.
+    """
+    gps = route.get('gps')
+    if gps is None or gps.unit_for(route['truck']) == route.get('gps_unit'):
+        return False
+    gps_streets, index = gps.streets_for(route['truck'])
+    df = verify_itsas_against_gps(route['claude_json'].get('itsas', []), index, gps.coverage_for(route['truck']))
+    route.update({"gps_streets": gps_streets, "gps_unit": gps.unit_for(route['truck'])})
+    set_gps_status(route, df)
+    gps_done, itsa_rows = route['gps_done'], route['itsa_rows']
+    for key in [k for k in route['manual_overrides'] if k in itsa_rows and gps_done[itsa_rows[k]]]:
+        apply_override(route, key, False)
+    return True
+
+
+def fleet_totals(route_entries: list) -> dict:
+    return {'done': sum(r['done'] for r in route_entries), 'total': sum(r['total'] for r in route_entries)}
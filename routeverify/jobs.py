@@ -0,0 +1,161 @@
+"""Background extraction jobs: route sheets turned into route entries on process-wide worker threads."""
+import io
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from .extraction import ExtractionError, extract_route_sheet
+from .gps import build_route_entry, load_rastrac_gps
+
+if TYPE_CHECKING:
+    import anthropic
+
+    from .geometry import StreetGeometry
+
+logger = logging.getLogger(__name__)
+
+JOB_POOL_THREADS = 16          # ceiling of the "Parallel extractions" setting
+JOB_RETENTION_SECONDS = 3600   # results nobody collected (closed tabs) are dropped after this
+
+
+class ExtractionJob:
+    """One route sheet on its way to a route entry; status and results are written by the worker.
+
+    ``client`` is the submitting session's Anthropic client, so the sheet is billed to its key.
+    Sheets uploaded together share a ``batch`` id so their routes can be attached in upload order.
+    ``shift_key`` is the (shift date, garage) the sheet was uploaded into; the finished route goes
+    there even if the session has switched shifts meanwhile.
+    """
+
+    def __init__(self, client: 'anthropic.Anthropic', filename: str, file_bytes: bytes, truck: str, route: str,
+                 gps_future: Future, truck_from_filename: bool = False, batch: Optional[str] = None,
+                 shift_key: Optional[tuple[str, str]] = None):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.batch = batch
+        self.shift_key = shift_key
+        self.filename = filename
+        self.file_bytes = file_bytes
+        self.truck = truck
+        self.route = route
+        self.gps_future = gps_future
+        self.truck_from_filename = truck_from_filename
+        self.status = 'queued'  # → running → done | failed
+        self.route_entry: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.notices: List[str] = []
+        self.finished_at: Optional[float] = None
+
+
+def ready_jobs(jobs: List[ExtractionJob]) -> List[ExtractionJob]:
+    """Finished jobs that can be attached now, from a list in submission order.
+
+    A finished sheet waits while any earlier sheet of its batch is still queued or running, so a
+    batch's routes land in upload order however the workers finish.
+    """
+    ready, waiting = [], set()
+    for job in jobs:
+        if job.status in ('done', 'failed') and job.batch not in waiting:
+            ready.append(job)
+        elif job.batch is not None:
+            waiting.add(job.batch)
+    return ready
+
+
+class JobQueue:
+    """Process-wide worker threads that turn route sheets into route entries off the script thread.
+
+    Browser sessions only hold job ids and poll for results, so reruns never abort a job. At most
+    ``max_workers`` sheets are with Claude at once; GPS files load on their own small pool.
+    """
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=JOB_POOL_THREADS, thread_name_prefix='extract')
+        self._gps_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='gps')
+        self._jobs: Dict[str, ExtractionJob] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.Condition()
+        self._running = 0
+        self.max_workers = 1
+
+    def set_max_workers(self, n: int):
+        with self._slots:
+            self.max_workers = max(1, int(n))
+            self._slots.notify_all()
+
+    def load_gps(self, gps_bytes: bytes, geometry: Optional['StreetGeometry'] = None) -> Future:
+        return self._gps_pool.submit(load_rastrac_gps, io.BytesIO(gps_bytes), geometry=geometry)
+
+    def submit(self, client: 'anthropic.Anthropic', filename: str, file_bytes: bytes, truck: str, route: str,
+               gps_future: Future, truck_from_filename: bool = False, batch: Optional[str] = None,
+               shift_key: Optional[tuple[str, str]] = None) -> str:
+        job = ExtractionJob(client, filename, file_bytes, truck, route, gps_future, truck_from_filename, batch,
+                            shift_key)
+        with self._lock:
+            cutoff = time.time() - JOB_RETENTION_SECONDS
+            for stale in [i for i, j in self._jobs.items() if j.finished_at and j.finished_at < cutoff]:
+                del self._jobs[stale]
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job)
+        return job.id
+
+    def get(self, job_ids: List[str]) -> List[ExtractionJob]:
+        with self._lock:
+            return [self._jobs[i] for i in job_ids if i in self._jobs]
+
+    def forget(self, job_ids):
+        with self._lock:
+            for job_id in job_ids:
+                self._jobs.pop(job_id, None)
+
+    @contextmanager
+    def _slot(self):
+        with self._slots:
+            while self._running >= self.max_workers:
+                self._slots.wait()
+            self._running += 1
+        try:
+            yield
+        finally:
+            with self._slots:
+                self._running -= 1
+                self._slots.notify_all()
+
+    def _run(self, job: ExtractionJob):
+        try:
+            with self._slot():
+                job.status = 'running'
+                claude_json = extract_route_sheet(job.client, job.file_bytes, job.filename)
+            if not claude_json.get('itsas'):
+                raise ExtractionError("No ITSAs found in route sheet.")
+            try:
+                gps = job.gps_future.result()
+            except Exception as e:
+                raise ExtractionError(f"Failed to load GPS file: {e}")
+            truck = job.truck
+            if job.truck_from_filename:
+                # Filenames like 24DP-421.jpg pick that truck's pings straight away
+                unit = gps.unit_in_name(job.filename)
+                truck = gps.unit_labels[unit] if unit else truck
+            job.route_entry = build_route_entry(truck, job.route, claude_json, gps,
+                                                sheet=(job.filename, job.file_bytes))
+            if claude_json.get('template_match') is not None:
+                job.notices.append(f"♻️ {job.filename} matched a stored route template "
+                                   f"({claude_json['template_match']:.0%}) — Claude skipped")
+            if not gps.by_unit:
+                job.notices.append("GPS file has no vehicle/unit column — routes are checked against all trucks' streets.")
+            elif not job.route_entry['gps_unit'] and not job.truck_from_filename:
+                job.notices.append(f"Truck {truck} not found in the GPS file — verified against all trucks.")
+            job.status = 'done'
+        except json.JSONDecodeError as e:
+            job.error, job.status = f"Claude returned invalid JSON: {e}", 'failed'
+        except Exception as e:
+            logger.warning(f"Extraction job failed for {job.filename}: {e}")
+            job.error, job.status = str(e), 'failed'
+        finally:
+            job.finished_at = time.time()
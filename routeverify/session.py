@@ -0,0 +1,269 @@
+"""Session files and the per-shift route store."""
+import io
+import json
+import os
+import threading
+import time
+import uuid
+import zipfile
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from .gps import DETAIL_COLUMNS, RastracGps, fleet_totals, reverify_for_truck, set_gps_status
+from .utils import sqlite_connection
+
+# ─── SESSION FILES ─────────────────────────────────────────────────────────────
+
+SESSION_FORMAT = "routeverify-session"
+SESSION_VERSION = 2
+ROUTE_SAVE_FIELDS = ('id', 'truck', 'route', 'claude_json', 'gps_unit', 'workers', 'shift_start', 'shift_end',
+                     'notes', 'manual_overrides')
+
+
+def gps_record(gps: RastracGps) -> dict:
+    """A GPS export's street sets with each name stored once; per-unit sets are indices into ``streets``.
+
+    Ping runs and snapped segments aren't kept, so a re-verify after loading falls back to name matching.
+    """
+    streets = sorted(gps.streets.union(*gps.by_unit.values()))
+    pos = {name: i for i, name in enumerate(streets)}
+    return {'streets': streets, 'unit_labels': gps.unit_labels,
+            'by_unit': {unit: sorted(pos[name] for name in names) for unit, names in gps.by_unit.items()}}
+
+
+def gps_from_record(gps_id: str, rec: dict) -> RastracGps:
+    streets = rec['streets']
+    gps = RastracGps(set(streets))
+    gps.id = gps_id
+    gps.by_unit = {unit: {streets[i] for i in idx} for unit, idx in rec['by_unit'].items()}
+    gps.unit_labels = rec.get('unit_labels', {})
+    return gps
+
+
+def route_record(r: dict) -> dict:
+    rec = {k: r.get(k) for k in ROUTE_SAVE_FIELDS}
+    rec['gps'] = r['gps'].id if r.get('gps') is not None else None
+    rec['df'] = r['df'].to_dict(orient='split', index=False)
+    return rec
+
+
+def route_from_record(rec: dict, gps_by_id: Dict[str, RastracGps]) -> dict:
+    """Rebuild a route entry; the bool status arrays come back from the stored Status column."""
+    route = {k: rec.get(k, '') for k in ROUTE_SAVE_FIELDS}
+    route['id'] = rec.get('id') or uuid.uuid4().hex
+    route['claude_json'] = rec.get('claude_json') or {}
+    # v1 files also stored unticked overrides as False
+    route['manual_overrides'] = {k: True for k, v in (rec.get('manual_overrides') or {}).items() if v}
+    gps = gps_by_id.get(rec.get('gps'))
+    unit = rec.get('gps_unit')
+    # The set, not streets_for(): its StreetIndex is only needed if the route gets re-verified
+    gps_streets = (gps.by_unit.get(unit, gps.streets) if unit else gps.streets) if gps is not None else set()
+    route.update({'gps': gps, 'gps_unit': unit, 'sheet': None, 'gps_streets': gps_streets})
+    df = rec.get('df') or {'columns': [], 'data': []}
+    if isinstance(df, list):  # v1: one dict per row
+        set_gps_status(route, pd.DataFrame(df))
+    else:
+        set_gps_status(route, pd.DataFrame(df['data'], columns=df['columns']))
+    return route
+
+
+def dump_session(route_entries: list) -> bytes:
+    """Session file: a zip holding one compact JSON document, each GPS export stored once."""
+    gps = {r['gps'].id: r['gps'] for r in route_entries if r.get('gps') is not None}
+    doc = {'format': SESSION_FORMAT, 'version': SESSION_VERSION,
+           'gps': {gps_id: gps_record(g) for gps_id, g in gps.items()},
+           'routes': [route_record(r) for r in route_entries]}
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('session.json', json.dumps(doc, separators=(',', ':'), default=str))
+    return buf.getvalue()
+
+
+def load_session(data: bytes) -> list:
+    """Route entries (under new ids) from a session file; plain JSON lists from before the zip format still load."""
+    if not zipfile.is_zipfile(io.BytesIO(data)):
+        return _fresh_ids([route_from_record(entry, {}) for entry in json.loads(data)])
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        doc = json.loads(zf.read('session.json'))
+    if doc.get('format') != SESSION_FORMAT or doc.get('version', 0) > SESSION_VERSION:
+        raise ValueError(f"not a RouteVerify session file this version can read (version {doc.get('version')})")
+    gps_by_id = {gps_id: gps_from_record(gps_id, rec) for gps_id, rec in doc['gps'].items()}
+    return _fresh_ids([route_from_record(rec, gps_by_id) for rec in doc['routes']])
+
+
+def _fresh_ids(routes: list) -> list:
+    # The store keys routes by id alone, so a file loaded into two shifts must not share ids
+    for route in routes:
+        route['id'] = uuid.uuid4().hex
+    return routes
+
+
+def _route_signature(r: dict) -> tuple:
+    # status_version moves on every re-verify and override toggle; the overrides are hashed as well
+    # so edits that bypass apply_override are still written
+    return (r.get('status_version'), r['truck'], r['route'], r.get('workers'), r.get('shift_start'),
+            r.get('shift_end'), r.get('notes'), hash(frozenset(r['manual_overrides'])))
+
+# ─── SHIFT STORE ───────────────────────────────────────────────────────────────
+
+ITSA_COLUMNS = DETAIL_COLUMNS + ['Status', 'Coverage %']
+ROUTE_STORE_FIELDS = ('truck', 'route', 'gps_unit', 'workers', 'shift_start', 'shift_end', 'notes')
+
+
+class ShiftStore:
+    """Routes, ITSAs, manual overrides and GPS street sets of every shift, keyed by (shift date, garage).
+
+    WAL mode so page loads reading a shift never wait on another supervisor's write.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with sqlite_connection(path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS gps (id TEXT PRIMARY KEY, record TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS routes ("
+                " id TEXT PRIMARY KEY, shift_date TEXT NOT NULL, garage TEXT NOT NULL, position INTEGER NOT NULL,"
+                " truck TEXT, route TEXT, gps_unit TEXT, workers TEXT, shift_start TEXT, shift_end TEXT, notes TEXT,"
+                " claude_json TEXT NOT NULL, gps_id TEXT, updated_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS routes_by_shift ON routes (shift_date, garage, position);"
+                "CREATE TABLE IF NOT EXISTS itsas ("
+                " route_id TEXT NOT NULL, pos INTEGER NOT NULL, number, street TEXT, from_cross TEXT, to_cross TEXT,"
+                " side TEXT, status TEXT, coverage REAL, PRIMARY KEY (route_id, pos));"
+                "CREATE TABLE IF NOT EXISTS overrides (route_id TEXT NOT NULL, itsa TEXT NOT NULL,"
+                " PRIMARY KEY (route_id, itsa));"
+            )
+
+    def load(self, shift_date: str, garage: str) -> list:
+        in_shift = "SELECT id FROM routes WHERE shift_date = ? AND garage = ?"
+        with sqlite_connection(self.path) as conn:
+            rows = conn.execute(f"SELECT id, {', '.join(ROUTE_STORE_FIELDS)}, claude_json, gps_id FROM routes"
+                                " WHERE shift_date = ? AND garage = ? ORDER BY position", (shift_date, garage)).fetchall()
+            itsas: Dict[str, list] = {}
+            for route_id, *row in conn.execute(
+                    "SELECT route_id, number, street, from_cross, to_cross, side, status, coverage FROM itsas"
+                    f" WHERE route_id IN ({in_shift}) ORDER BY route_id, pos", (shift_date, garage)):
+                itsas.setdefault(route_id, []).append(row)
+            overrides: Dict[str, dict] = {}
+            for route_id, itsa in conn.execute(f"SELECT route_id, itsa FROM overrides WHERE route_id IN ({in_shift})",
+                                               (shift_date, garage)):
+                overrides.setdefault(route_id, {})[itsa] = True
+            gps_by_id = {gps_id: gps_from_record(gps_id, json.loads(record)) for gps_id, record in conn.execute(
+                f"SELECT id, record FROM gps WHERE id IN (SELECT gps_id FROM routes WHERE id IN ({in_shift}))",
+                (shift_date, garage))}
+        routes = []
+        for route_id, *fields, claude_json, gps_id in rows:
+            rec = dict(zip(ROUTE_STORE_FIELDS, fields), id=route_id, claude_json=json.loads(claude_json), gps=gps_id,
+                       manual_overrides=overrides.get(route_id, {}),
+                       df={'columns': ITSA_COLUMNS, 'data': itsas.get(route_id, [])})
+            routes.append(route_from_record(rec, gps_by_id))
+        return routes
+
+    def save(self, shift_key: tuple[str, str], order: List[str], changed: list, new_gps: list, removed: set):
+        """One transaction: upsert changed routes (and any GPS export they brought), renumber, drop removed."""
+        now = time.time()
+        with sqlite_connection(self.path) as conn:
+            conn.executemany("INSERT OR IGNORE INTO gps (id, record) VALUES (?, ?)",
+                             [(g.id, json.dumps(gps_record(g), separators=(',', ':'))) for g in new_gps])
+            for r in changed:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO routes (id, shift_date, garage, position, {', '.join(ROUTE_STORE_FIELDS)},"
+                    " claude_json, gps_id, updated_at) VALUES (?, ?, ?, 0, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (r['id'], *shift_key, *(r.get(k) for k in ROUTE_STORE_FIELDS),
+                     json.dumps(r['claude_json'], default=str), r['gps'].id if r.get('gps') is not None else None, now))
+                conn.execute("DELETE FROM itsas WHERE route_id = ?", (r['id'],))
+                itsas = r['df'].reindex(columns=ITSA_COLUMNS).astype(object)
+                conn.executemany(
+                    "INSERT INTO itsas (route_id, pos, number, street, from_cross, to_cross, side, status, coverage)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(r['id'], pos, *row) for pos, row in enumerate(itsas.where(itsas.notna(), None).values.tolist())])
+                conn.execute("DELETE FROM overrides WHERE route_id = ?", (r['id'],))
+                conn.executemany("INSERT INTO overrides (route_id, itsa) VALUES (?, ?)",
+                                 [(r['id'], itsa) for itsa in r['manual_overrides']])
+            conn.executemany("UPDATE routes SET position = ? WHERE id = ?", [(pos, i) for pos, i in enumerate(order)])
+            for table, column in (('itsas', 'route_id'), ('overrides', 'route_id'), ('routes', 'id')):
+                conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(i,) for i in removed])
+            if removed:
+                conn.execute("DELETE FROM gps WHERE id NOT IN (SELECT gps_id FROM routes WHERE gps_id IS NOT NULL)")
+
+
+class Shift:
+    """One shift's routes, held once per server and shared by every session viewing it.
+
+    Sessions mutate the shared route dicts in place; sync() writes whatever changed through to the store.
+    """
+
+    def __init__(self, store: Optional[ShiftStore], shift_date: str, garage: str):
+        self.store = store
+        self.key = (shift_date, garage)
+        self.lock = threading.RLock()
+        self.routes: list = store.load(shift_date, garage) if store else []
+        self._by_id = {r['id']: r for r in self.routes}
+        self.fleet = fleet_totals(self.routes)
+        self._sigs = {r['id']: _route_signature(r) for r in self.routes}
+        self._order = [r['id'] for r in self.routes]
+        self._gps = {r['gps'].id for r in self.routes if r.get('gps') is not None}
+
+    def get(self, route_id: str) -> Optional[dict]:
+        return self._by_id.get(route_id)
+
+    def _count(self, route: dict, sign: int):
+        self.fleet['done'] += sign * route['done']
+        self.fleet['total'] += sign * route['total']
+
+    def add(self, route: dict):
+        with self.lock:
+            self.routes.append(route)
+            self._by_id[route['id']] = route
+            self._count(route, 1)
+
+    def remove(self, route_id: str):
+        with self.lock:
+            route = self._by_id.pop(route_id, None)
+            if route is not None:
+                self.routes[:] = [r for r in self.routes if r is not route]
+                self._count(route, -1)
+
+    def swap(self, route_id: str, new_route: dict):
+        """Put ``new_route`` in the place of ``route_id`` (e.g. after a re-extract)."""
+        with self.lock:
+            old = self._by_id.pop(route_id, None)
+            if old is None:
+                return
+            self.routes[next(i for i, r in enumerate(self.routes) if r is old)] = new_route
+            self._by_id[new_route['id']] = new_route
+            self._count(old, -1)
+            self._count(new_route, 1)
+
+    def reverify(self, route: dict) -> bool:
+        with self.lock:
+            self._count(route, -1)
+            changed = reverify_for_truck(route)
+            self._count(route, 1)
+        return changed
+
+    def replace(self, route_entries: list):
+        with self.lock:
+            self.routes[:] = route_entries
+            self._by_id = {r['id']: r for r in route_entries}
+            self.fleet.update(fleet_totals(route_entries))
+
+    def sync(self) -> int:
+        """Write routes changed since the last sync through to the store; returns how many."""
+        with self.lock:
+            order = [r['id'] for r in self.routes]
+            changed = [r for r in self.routes if self._sigs.get(r['id']) != _route_signature(r)]
+            if not changed and order == self._order:
+                return 0
+            new_gps = {r['gps'].id: r['gps'] for r in changed
+                       if r.get('gps') is not None and r['gps'].id not in self._gps}
+            removed = set(self._order) - set(order)
+            if self.store:
+                self.store.save(self.key, order, changed, list(new_gps.values()), removed)
+            # Exports no route references any more were pruned from the store
+            self._gps = {r['gps'].id for r in self.routes if r.get('gps') is not None}
+            self._sigs = {r['id']: _route_signature(r) for r in self.routes}
+            self._order = order
+            return len(changed)
@@ -0,0 +1,31 @@
+"""Helpers shared by the pipeline modules."""
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, List
+
+CACHE_DIR = os.getenv("ROUTEVERIFY_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "routeverify"))
+
+
+@contextmanager
+def sqlite_connection(path: str):
+    """Short-lived SQLite connection that commits on success and always closes."""
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def chunk_list(lst: list, n: int) -> List[list]:
+    return [lst[i:i+n] for i in range(0, len(lst), n)]
+
+
+def unique_filename(filename: str, seen: Dict[str, int]) -> str:
+    """``filename`` the first time, then 'stem (2).ext', 'stem (3).ext'...; ``seen`` counts uses so far."""
+    seen[filename] = seen.get(filename, 0) + 1
+    if seen[filename] == 1:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return f"{stem} ({seen[filename]}){ext}"
@@ -0,0 +1,270 @@
+"""DS-659 Work Left Out workbooks: the missed ITSAs of a route written into the DSNY template."""
+import functools
+import io
+import itertools
+import logging
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional
+from xml.sax.saxutils import escape, unescape
+
+import numpy as np
+import pandas as pd
+
+from .utils import chunk_list, unique_filename
+
+logger = logging.getLogger(__name__)
+
+# ─── WORK LEFT OUT — DS-659 EXCEL ──────────────────────────────────────────────
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ds659_template.xlsx")
+WLO_FIRST_ROW = 8
+WLO_LAST_ROW = 25
+WLO_PAGE_ROWS = WLO_LAST_ROW - WLO_FIRST_ROW + 1
+WLO_ROW_CELLS = ('A', 'B', 'C', 'D', 'H', 'J', 'L', 'M', 'N')
+WLO_COLUMNS = ['ITSA #', 'Side', 'Street', 'From', 'To']
+WLO_HEADER_CELLS = {'A3': 'district', 'D3': 'section', 'H1': 'vehicle_type', 'J1': 'material'}
+_XML_ILLEGAL_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_XLSX_CELL_RE = re.compile(r'<c r="([A-Z]+\d+)"([^>]*?)(?:/>|>.*?</c>)', re.DOTALL)
+_CALC_CHAIN_RE = re.compile(r'<(?:Override|Relationship) [^>]*calcChain[^>]*/>')
+
+
+def _xlsx_cell(ref: str, style: str, value) -> str:
+    """One <c> element; numbers stay numeric, text goes inline so sharedStrings is never touched."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)) or value == '':
+        return f'<c r="{ref}"{style}/>'
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+        return f'<c r="{ref}"{style}><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL_RE.sub('', str(value)))
+    return f'<c r="{ref}"{style} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class WorkLeftOutTemplate:
+    """ds659_template.xlsx read once, with its form sheet pre-split around every cell an export fills.
+
+    Exports join the literal XML between those cells with freshly rendered cells and copy the other
+    package parts verbatim, so no workbook is parsed per export. calcChain is dropped (as openpyxl
+    does) — Excel rebuilds it on open. Rows past the form's 18 lines go on continuation copies of
+    the form sheet, added to the workbook, rels and content types once the page count is known.
+    """
+
+    def __init__(self, path: str):
+        with zipfile.ZipFile(path) as zf:
+            self.members = [(info.filename, zf.read(info)) for info in zf.infolist()
+                            if info.filename != 'xl/calcChain.xml']
+        parts = dict(self.members)
+        workbook = parts['xl/workbook.xml'].decode('utf-8')
+        rels = parts['xl/_rels/workbook.xml.rels'].decode('utf-8')
+        first_rid = re.search(r'<sheet [^>]*r:id="([^"]+)"', workbook).group(1)
+        target = re.search(rf'<Relationship [^>]*Id="{first_rid}"[^>]*Target="([^"]+)"', rels) \
+            or re.search(rf'<Relationship [^>]*Target="([^"]+)"[^>]*Id="{first_rid}"', rels)
+        self.sheet_path = 'xl/' + target.group(1).lstrip('/').removeprefix('xl/')
+        self.sheet_rels_path = self.sheet_path.replace('worksheets/', 'worksheets/_rels/') + '.rels'
+        self.workbook = workbook
+        self.content_types = _CALC_CHAIN_RE.sub('', parts['[Content_Types].xml'].decode('utf-8'))
+        self.rels = _CALC_CHAIN_RE.sub('', rels)
+        first_sheet = re.search(r'<sheet [^>]*/>', workbook).group(0)
+        self.sheet_name = unescape(re.search(r'name="([^"]*)"', first_sheet).group(1))
+        self.first_sheet_index = workbook[:workbook.index(first_sheet)].count('<sheet ')
+        self.member_names = {name for name, _ in self.members}
+
+        # Literal XML chunks interleaved with (ref, style attr, default cell XML) slots
+        wanted = set(WLO_HEADER_CELLS) | {f'{col}{row}' for row in range(WLO_FIRST_ROW, WLO_LAST_ROW + 1)
+                                          for col in WLO_ROW_CELLS}
+        sheet = parts[self.sheet_path].decode('utf-8')
+        self._parts: List = []
+        pos = 0
+        for m in _XLSX_CELL_RE.finditer(sheet):
+            ref = m.group(1)
+            if ref not in wanted:
+                continue
+            style = ''.join(re.findall(r' s="\d+"', m.group(2)))
+            default = m.group(0) if ref in WLO_HEADER_CELLS else f'<c r="{ref}"{style}/>'
+            self._parts.extend([sheet[pos:m.start()], (ref, style, default)])
+            pos = m.end()
+            wanted.discard(ref)
+        self._parts.append(sheet[pos:])
+        if wanted:
+            raise ValueError(f"Template has no cell(s) {', '.join(sorted(wanted))}")
+        # Continuation pages must not open as a grouped selection with page 1
+        self._continuation_parts = [part.replace(' tabSelected="1"', '') if isinstance(part, str) else part
+                                    for part in self._parts]
+
+    def render_sheet(self, route_info: dict, rows: List[tuple], continuation: bool = False) -> str:
+        """Form sheet XML with the header filled and ``rows`` of (ITSA #, side, street, from, to) from row 8."""
+        values = {ref: route_info.get(field) for ref, field in WLO_HEADER_CELLS.items() if route_info.get(field)}
+        section = route_info.get('section', '')
+        for row_num, (num, side, street, from_cross, to_cross) in enumerate(rows, start=WLO_FIRST_ROW):
+            values.update({f'A{row_num}': section, f'B{row_num}': num, f'C{row_num}': side,
+                           f'D{row_num}': street, f'H{row_num}': from_cross, f'J{row_num}': to_cross})
+        return ''.join(part if isinstance(part, str)
+                       else _xlsx_cell(part[0], part[1], values[part[0]]) if part[0] in values else part[2]
+                       for part in (self._continuation_parts if continuation else self._parts))
+
+    def _page_path(self, page: int) -> str:
+        if page == 1:
+            return self.sheet_path
+        folder = self.sheet_path.rsplit('/', 1)[0]
+        return next(path for n in itertools.count(page) if (path := f"{folder}/sheet{n}.xml") not in self.member_names)
+
+    def _package_parts(self, pages: int) -> Dict[str, str]:
+        """workbook.xml, its rels and [Content_Types].xml listing ``pages`` copies of the form sheet."""
+        workbook, rels, content_types = self.workbook, self.rels, self.content_types
+        n_sheets = workbook.count('<sheet ')
+        sheet_ids = [int(i) for i in re.findall(r'<sheet [^>]*sheetId="(\d+)"', workbook)]
+        local_names = re.findall(rf'<definedName [^>]*localSheetId="{self.first_sheet_index}"[^>]*>.*?</definedName>',
+                                 workbook)
+        new_sheets, new_names, new_rels, new_types = [], [], [], []
+        for page in range(2, pages + 1):
+            name = f"{self.sheet_name} ({page})"[-31:]
+            rel_id = f"rIdWlo{page}"
+            path = self._page_path(page)
+            new_sheets.append(f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{max(sheet_ids) + page - 1}" r:id="{rel_id}"/>')
+            quoted = "'" + self.sheet_name.replace("'", "''") + "'!"
+            for defined in local_names:
+                defined = defined.replace(f'localSheetId="{self.first_sheet_index}"',
+                                          f'localSheetId="{n_sheets + page - 2}"')
+                new_names.append(defined.replace(escape(quoted), escape("'" + name.replace("'", "''") + "'!")))
+            new_rels.append(f'<Relationship Id="{rel_id}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                            f'relationships/worksheet" Target="{path.removeprefix("xl/")}"/>')
+            new_types.append(f'<Override PartName="/{path}" ContentType="application/vnd.openxmlformats-'
+                             f'officedocument.spreadsheetml.worksheet+xml"/>')
+        workbook = workbook.replace('</sheets>', ''.join(new_sheets) + '</sheets>', 1)
+        if new_names:
+            workbook = workbook.replace('</definedNames>', ''.join(new_names) + '</definedNames>', 1)
+        return {
+            'xl/workbook.xml': workbook,
+            'xl/_rels/workbook.xml.rels': rels.replace('</Relationships>', ''.join(new_rels) + '</Relationships>', 1),
+            '[Content_Types].xml': content_types.replace('</Types>', ''.join(new_types) + '</Types>', 1),
+        }
+
+    def write(self, out, route_info: dict, rows: Iterable[tuple]) -> int:
+        """Stream the workbook into the binary file ``out``; returns the number of form pages.
+
+        ``rows`` may be any iterable (e.g. a generator over thousands of ITSAs): pages are rendered
+        and compressed one at a time, and the package parts that list the sheets are written last.
+        """
+        rows = iter(rows)
+        sheet_rels = dict(self.members).get(self.sheet_rels_path)
+        with zipfile.ZipFile(out, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+            pages = 0
+            while True:
+                page_rows = list(itertools.islice(rows, WLO_PAGE_ROWS))
+                if pages and not page_rows:
+                    break
+                pages += 1
+                zf.writestr(self._page_path(pages), self.render_sheet(route_info, page_rows, continuation=pages > 1))
+                if pages > 1 and sheet_rels is not None:
+                    path = self._page_path(pages)
+                    zf.writestr(path.replace('worksheets/', 'worksheets/_rels/') + '.rels', sheet_rels)
+            package = self._package_parts(pages)
+            for name, data in self.members:
+                if name != self.sheet_path:
+                    zf.writestr(name, package.get(name, data))
+        return pages
+
+    def render(self, route_info: dict, rows: Iterable[tuple]) -> bytes:
+        buf = io.BytesIO()
+        self.write(buf, route_info, rows)
+        return buf.getvalue()
+
+
+# A plain process-wide lru_cache rather than st.cache_resource: this module also runs in the batch
+# CLI, without Streamlit. Keying on the mtime picks up a replaced template file.
+@functools.lru_cache(maxsize=4)
+def get_wlo_template(path: str, mtime: float) -> Optional[WorkLeftOutTemplate]:
+    """Parsed template per file version; None if its layout can't be patched directly."""
+    try:
+        return WorkLeftOutTemplate(path)
+    except Exception as e:
+        logger.warning(f"WLO template can't be patched in place ({e}); using openpyxl")
+        return None
+
+
+def generate_work_left_out(missed_df: pd.DataFrame, route_info: dict) -> bytes:
+    """DS-659 Work Left Out workbook; past 18 missed ITSAs the form continues on extra sheets."""
+    rows = list(missed_df.reindex(columns=WLO_COLUMNS).itertuples(index=False, name=None))
+    template = get_wlo_template(TEMPLATE_PATH, os.path.getmtime(TEMPLATE_PATH))
+    if template is not None:
+        return template.render(route_info, rows)
+    from openpyxl import load_workbook  # only for templates the direct XML writer can't handle
+
+    wb = load_workbook(TEMPLATE_PATH)
+    ws = wb.active
+    for ref, field in WLO_HEADER_CELLS.items():
+        ws[ref] = route_info.get(field, '') or ws[ref].value
+    for row_num in range(WLO_FIRST_ROW, WLO_LAST_ROW + 1):
+        for col in WLO_ROW_CELLS:
+            ws[f'{col}{row_num}'] = None
+    pages = [ws] + [wb.copy_worksheet(ws) for _ in chunk_list(rows, WLO_PAGE_ROWS)[1:]]
+    for page, (page_ws, page_rows) in enumerate(zip(pages, chunk_list(rows, WLO_PAGE_ROWS)), start=1):
+        if page > 1:
+            page_ws.title = f"{ws.title} ({page})"[-31:]
+        for row_num, (num, side, street, from_cross, to_cross) in enumerate(page_rows, start=WLO_FIRST_ROW):
+            page_ws[f'A{row_num}'] = route_info.get('section', '')
+            page_ws[f'B{row_num}'] = num
+            page_ws[f'C{row_num}'] = side
+            page_ws[f'D{row_num}'] = street
+            page_ws[f'H{row_num}'] = from_cross
+            page_ws[f'J{row_num}'] = to_cross
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def get_truly_missed_df(r: dict) -> pd.DataFrame:
+    """Return SKIPPED rows that are NOT manually overridden."""
+    df = r["df"]
+    missed_df = df[~r['gps_done'] & ~df["ITSA #"].astype(str).isin(r['manual_overrides'])]
+    return missed_df
+
+
+WLO_HEADER_FIELDS = ('district', 'section', 'vehicle_type', 'material')
+
+
+def work_left_out_key(r: dict) -> Optional[tuple]:
+    """(header fields, missed rows) — everything a route's WLO workbook depends on; None if nothing was missed."""
+    missed_df = get_truly_missed_df(r)
+    if missed_df.empty:
+        return None
+    cj = r["claude_json"]
+    header = tuple(cj.get(field, '') for field in WLO_HEADER_FIELDS)
+    return header, tuple(missed_df[WLO_COLUMNS].itertuples(index=False, name=None))
+
+
+def work_left_out_xlsx(header: tuple, rows: tuple) -> bytes:
+    """Workbook for a work_left_out_key(); the app memoizes this per key."""
+    missed_df = pd.DataFrame(list(rows), columns=WLO_COLUMNS)
+    return generate_work_left_out(missed_df, dict(zip(WLO_HEADER_FIELDS, header)))
+
+
+def work_left_out_filename(r: dict) -> str:
+    cj = r["claude_json"]
+    return f"Work_Left_Out_{cj.get('section', 'SEC')}_{cj.get('route', 'RTE')}_{r['truck']}.xlsx"
+
+
+WLO_ZIP_WORKERS = 4
+WLO_ZIP_SPOOL_BYTES = 8 * 1024 * 1024  # archives past this spill from memory to a temp file
+
+
+def build_wlo_zip(items: List[tuple[str, tuple]], render: Callable[..., bytes] = work_left_out_xlsx) -> bytes:
+    """ZIP of (filename, work_left_out_key) workbooks, rendered by ``render`` on worker threads.
+
+    Each workbook is added as soon as it is ready and then dropped, into a spooled temp file,
+    so only the finished archive is ever held whole. Workbooks are already deflated and are
+    stored as-is.
+    """
+    names: Dict[str, int] = {}
+    unique_items = [(unique_filename(filename, names), key) for filename, key in items]
+    with tempfile.SpooledTemporaryFile(max_size=WLO_ZIP_SPOOL_BYTES) as spool:
+        with zipfile.ZipFile(spool, mode='w', compression=zipfile.ZIP_STORED) as zf, \
+                ThreadPoolExecutor(max_workers=WLO_ZIP_WORKERS, thread_name_prefix='wlo') as pool:
+            futures = {pool.submit(render, *key): filename for filename, key in unique_items}
+            for fut in as_completed(futures):
+                zf.writestr(futures.pop(fut), fut.result())
+        spool.seek(0)
+        return spool.read()
+
@@ -0,0 +1,41 @@
+"""DS-332 pagination and the per-district/section ZIP."""
+import io
+import re
+import zipfile
+
+import pytest
+
+from routeverify.ds332 import DS332_PAGE_ROWS, build_ds332_zip, render_ds332_pdf
+
+
+def rows(n: int, district='BK11', section='BKN11') -> tuple:
+    return tuple((f'24DP-{i}', str(i), section, district, 'REFUSE', 'SMITH J.', 50.0, 2, 4, '')
+                 for i in range(1, n + 1))
+
+
+def page_texts(pdf: bytes) -> list:
+    from pypdf import PdfReader
+    return [page.extract_text() or '' for page in PdfReader(io.BytesIO(pdf)).pages]
+
+
+@pytest.mark.parametrize('n, pages', [(0, 1), (1, 1), (DS332_PAGE_ROWS, 1), (DS332_PAGE_ROWS + 1, 2),
+                                      (3 * DS332_PAGE_ROWS, 3)])
+def test_one_page_per_page_rows_routes(n, pages):
+    texts = page_texts(render_ds332_pdf(rows(n), '01/05/2026', 'Brooklyn 11'))
+    assert len(texts) == pages
+    for page_no, text in enumerate(texts, start=1):
+        labels = re.findall(r'PAGE:\s*(\d+)\s*of\s*(\d+)', text)
+        assert labels == ([(str(page_no), str(pages))] if pages > 1 else [])
+    assert 'TOTAL ROUTES' in texts[-1] and all('TOTAL ROUTES' not in t for t in texts[:-1])
+    # Route numbering carries on across pages
+    if n > DS332_PAGE_ROWS:
+        assert f'24DP-{DS332_PAGE_ROWS + 1}' in texts[1] and f'24DP-{DS332_PAGE_ROWS + 1}' not in texts[0]
+
+
+def test_zip_names_groups_that_sanitize_alike_apart():
+    grouped = rows(2, district='Q 1') + rows(3, district='Q_1') + rows(1, district='')
+    data = build_ds332_zip(grouped, '01/05/2026', '', 'district', render=lambda group, *args: str(len(group)).encode())
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert {n: zf.read(n) for n in zf.namelist()} == {'DS332_District_Q_1.pdf': b'2',
+                                                          'DS332_District_Q_1 (2).pdf': b'3',
+                                                          'DS332_District_UNKNOWN.pdf': b'1'}
@@ -0,0 +1,131 @@
+"""Route template matching: stored ITSA lists are only reused for the route the new sheet names."""
+import pytest
+
+from routeverify import extraction
+from routeverify.extraction import RouteTemplateStore, text_tokens
+
+HEADER = "DS-659 ROUTE NARRATIVE  DISTRICT {district}  SECTION {section}  ROUTE {route}  DATE 10/17/2026  SHIFT 0600-1400"
+
+
+def header(section='BKN11', route='12', district='BK11', extra=''):
+    return HEADER.format(section=section, route=route, district=district) + extra
+
+
+def fingerprint(text: str) -> str:
+    return " ".join(sorted(text_tokens(text)))
+
+
+def route_json(section='BKN11', route='12', district='BK11'):
+    return {'section': section, 'route': route, 'district': district, 'extraction_confidence': 'high',
+            'itsas': [{'number': 1, 'street': f'ROUTE {route} ST', 'from_cross': 'A', 'to_cross': 'B', 'side': 'B'}]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RouteTemplateStore(str(tmp_path / 'templates.sqlite3'))
+
+
+def test_single_template_does_not_match_another_route(store):
+    store.save('header', fingerprint(header()), route_json())
+    assert store.match('header', fingerprint(header(route='13'))) is None
+    assert store.match('header', fingerprint(header(section='BKN12'))) is None
+
+
+def test_same_route_matches_despite_date_and_ocr_noise(store):
+    store.save('header', fingerprint(header()), route_json())
+    noisy = header(extra=" SMITH").replace("10/17/2026", "10/18/2026").replace("NARRATIVE", "NARRAT1VE")
+    claude_json, similarity = store.match('header', fingerprint(noisy))
+    assert claude_json['itsas'][0]['street'] == 'ROUTE 12 ST'
+    assert extraction.TEMPLATE_HEADER_MIN_SIMILARITY <= similarity < 1
+
+
+def test_several_templates_pick_the_named_route(store):
+    for route in ('11', '12', '13'):
+        store.save('header', fingerprint(header(route=route)), route_json(route=route))
+    for route in ('11', '12', '13'):
+        claude_json, similarity = store.match('header', fingerprint(header(route=route)))
+        assert claude_json['route'] == route and similarity == 1.0
+
+
+def test_header_naming_two_stored_routes_is_ambiguous(store):
+    store.save('header', fingerprint(header(route='12')), route_json(route='12'))
+    store.save('header', fingerprint(header(route='13')), route_json(route='13'))
+    assert store.match('header', fingerprint(header(route='12', extra=' 13'))) is None
+
+
+def test_similar_text_without_the_route_header_is_rejected(store):
+    store.save('pdf', fingerprint(header()), route_json())
+    assert store.match('pdf', fingerprint(header().replace('ROUTE 12', 'ROUTE'))) is None
+
+
+def test_pdf_needs_absolute_similarity(store):
+    body = " ".join(f"ITSA{i} STREET{i}" for i in range(40))
+    store.save('pdf', fingerprint(header(extra=body)), route_json())
+    assert store.match('pdf', fingerprint(header(extra=body))) is not None
+    changed = " ".join(f"ITSA{i} STREET{i + 100}" for i in range(40))
+    assert store.match('pdf', fingerprint(header(extra=changed))) is None
+
+
+def test_store_drops_whole_photo_hashes(tmp_path):
+    path = str(tmp_path / 'templates.sqlite3')
+    RouteTemplateStore(path).save('image', 'ab' * 32, route_json())
+    assert RouteTemplateStore(path).match('header', fingerprint(header())) is None
+
+
+class FakeMessages:
+    def __init__(self, response: str):
+        self.response = response
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return type('Message', (), {'content': [type('Block', (), {'type': 'text', 'text': self.response})]})
+
+
+class FakeClient:
+    def __init__(self, response: str):
+        self.messages = FakeMessages(response)
+
+
+@pytest.fixture
+def sheets(store, monkeypatch):
+    """extract_route_sheet over photos whose OCR'd header is the file's bytes."""
+    monkeypatch.setattr(extraction, 'header_text', lambda image_bytes: image_bytes.decode())
+    monkeypatch.setattr(extraction, 'compress_image', lambda image_bytes: (image_bytes, 'image/jpeg'))
+
+    def extract(sheet_header: str, claude_json: dict):
+        client = FakeClient(extraction.json.dumps(claude_json))
+        monkeypatch.setattr(extraction, 'route_templates', store)
+        monkeypatch.setattr(extraction, 'extraction_cache', None)
+        return extraction.extract_route_sheet(client, sheet_header.encode(), 'sheet.jpg'), client.messages.calls
+    return extract
+
+
+def test_extract_route_sheet_reuses_template_only_for_its_route(sheets):
+    first, calls = sheets(header(), route_json())
+    assert calls == 1 and 'template_match' not in first
+    reused, calls = sheets(header(), route_json(route='99'))
+    assert calls == 0 and reused['route'] == '12' and reused['template_match'] == 1.0
+    other, calls = sheets(header(route='13'), route_json(route='13'))
+    assert calls == 1 and other['route'] == '13'
+
+
+def test_extract_route_sheet_does_not_store_unconfirmed_routes(sheets):
+    misread = route_json(route='21')  # Claude read a route number the header doesn't carry
+    sheets(header(), misread)
+    _, calls = sheets(header(), misread)
+    assert calls == 1
+
+
+def test_cache_hit_skips_the_fingerprint(tmp_path, monkeypatch):
+    cache = extraction.ExtractionCache(str(tmp_path / 'cache.sqlite3'), max_bytes=1 << 20)
+    fingerprints = []
+    monkeypatch.setattr(extraction, 'extraction_cache', cache)
+    monkeypatch.setattr(extraction, 'route_templates', None)
+    monkeypatch.setattr(extraction, 'compress_image', lambda image_bytes: (image_bytes, 'image/jpeg'))
+    monkeypatch.setattr(extraction, 'sheet_fingerprint', lambda *args: fingerprints.append(args))
+    client = FakeClient(extraction.json.dumps(route_json()))
+    for _ in range(3):
+        assert extraction.extract_route_sheet(client, b'photo', 'sheet.jpg')['route'] == '12'
+    assert client.messages.calls == 1 and len(fingerprints) == 1
+    assert (cache.hits, cache.misses) == (2, 1)
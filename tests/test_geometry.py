@@ -0,0 +1,109 @@
+"""Snapping and block coverage on a small synthetic street grid."""
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from routeverify.geometry import SNAP_MAX_METERS, StreetGeometry, _collapse_feature_runs
+from routeverify.gps import _M_PER_DEG_LAT, _M_PER_DEG_LON, PROJECTION_ORIGIN, load_rastrac_gps, verify_itsas_against_gps
+
+# Three avenues 145 m apart crossing MAIN ST (y=0) and OAK ST (y=100); each centerline is one block
+BLOCK_METERS = 145.0
+
+
+def lonlat(x: float, y: float) -> tuple[float, float]:
+    return PROJECTION_ORIGIN[1] + x / _M_PER_DEG_LON, PROJECTION_ORIGIN[0] + y / _M_PER_DEG_LAT
+
+
+def grid_lines() -> List[tuple]:
+    lines = []
+    for i, avenue in enumerate(['1ST AVE', '2ND AVE', '3RD AVE']):
+        x = i * BLOCK_METERS
+        lines += [(avenue, [lonlat(x, -100.0), lonlat(x, 0.0)]), (avenue, [lonlat(x, 0.0), lonlat(x, 100.0)])]
+    for street, y in [('MAIN ST', 0.0), ('OAK ST', 100.0)]:
+        lines += [(street, [lonlat(i * BLOCK_METERS, y), lonlat((i + 1) * BLOCK_METERS, y)]) for i in range(2)]
+    return lines
+
+
+@pytest.fixture(scope='module')
+def grid() -> StreetGeometry:
+    return StreetGeometry(grid_lines())
+
+
+def write_pings(path, tracks, timed: bool = True):
+    """tracks: {unit: [(x, y), ...]} in driving order, written interleaved like a fleet export."""
+    rows = []
+    for unit, points in tracks.items():
+        for i, (x, y) in enumerate(points):
+            lon, lat = lonlat(x, y)
+            rows.append({'Unit': unit, 'Time': pd.Timestamp('2026-01-05 08:00') + pd.Timedelta(seconds=10 * i),
+                         'Latitude': lat, 'Longitude': lon})
+    df = pd.DataFrame(rows).sort_values('Time', kind='stable')
+    if not timed:
+        df = df.drop(columns='Time')
+    df.to_csv(path, index=False)
+
+
+def line(x0, y0, x1, y1, step: float = 10.0) -> List[tuple]:
+    n = max(1, int(round(np.hypot(x1 - x0, y1 - y0) / step)))
+    return [(x0 + (x1 - x0) * k / n, y0 + (y1 - y0) * k / n) for k in range(n + 1)]
+
+
+# Up 1ST AVE, along OAK ST, down 2ND AVE: never on MAIN ST, but one noisy ping 3 m inside each end of it
+AROUND_THE_BLOCK = (line(0, -100, 0, -10) + [(3.0, 1.0)] + line(0, 10, 0, 100)
+                    + line(10, 100, 135, 100) + line(145, 100, 145, 10) + [(142.0, -1.0)] + line(145, -10, 145, -100))
+DOWN_MAIN = line(0, -30, 0, -10) + line(0, 0, 2 * BLOCK_METERS, 0)
+
+ITSA = {'number': 1, 'street': 'MAIN ST', 'from_cross': '1ST AVE', 'to_cross': '2ND AVE'}
+
+
+def test_snap_picks_nearest_feature_and_position(grid):
+    x, y = np.array([20.0, 150.0, 0.5, 60.0, 60.0]), np.array([2.0, -1.0, 50.0, SNAP_MAX_METERS + 5, 40.0])
+    feature, position = grid.snap(x, y)
+    names = [grid.names[f] if f >= 0 else None for f in feature]
+    assert names == ['MAIN ST', 'MAIN ST', '1ST AVE', None, None]
+    assert position[:3] == pytest.approx([20.0, 5.0, 50.0], abs=0.5)
+    assert np.isnan(position[3:]).all()
+
+
+def test_block_follows_the_street_between_its_cross_streets(grid):
+    one = grid.block('MAIN ST', '1ST AVE', '2ND AVE')
+    two = grid.block('MAIN ST', '3RD AVE', '1ST AVE')
+    assert len(one) == 1 and len(two) == 2 and set(one) < set(two)
+    assert sum(grid.lengths[f] for f in two) == pytest.approx(2 * BLOCK_METERS, rel=1e-3)
+    assert grid.block('MAIN ST', '1ST AVE', 'ELM ST') is None
+
+
+def test_crossing_only_the_ends_of_a_block_is_not_done(tmp_path, grid):
+    path = tmp_path / 'gps.csv'
+    write_pings(path, {'T1': AROUND_THE_BLOCK})
+    gps = load_rastrac_gps(str(path), geometry=grid)
+    coverage = gps.coverage_for('T1')
+    assert coverage.coverage('MAIN ST', '1ST AVE', '2ND AVE') < 0.3
+    result = verify_itsas_against_gps([ITSA], gps.streets, coverage)
+    assert result.loc[0, 'Status'] == '❌ SKIPPED'
+
+
+@pytest.mark.parametrize('chunksize', [1, 7, 100_000])
+@pytest.mark.parametrize('timed', [True, False])
+def test_driving_the_block_is_done(tmp_path, grid, chunksize, timed):
+    path = tmp_path / 'gps.csv'
+    write_pings(path, {'T1': AROUND_THE_BLOCK, 'T2': DOWN_MAIN}, timed=timed)
+    gps = load_rastrac_gps(str(path), chunksize=chunksize, geometry=grid)
+    assert gps.coverage_for('T2').coverage('MAIN ST', '1ST AVE', '3RD AVE') == 1.0
+    assert gps.coverage_for('T1').coverage('MAIN ST', '1ST AVE', '2ND AVE') < 0.3
+    assert len(gps.segments['T1'][grid.block('MAIN ST', '1ST AVE', '2ND AVE')[0]]) == 2
+    result = verify_itsas_against_gps([ITSA], gps.streets, gps.coverage_for('T2'))
+    assert result.loc[0, 'Status'] == '✅ DONE' and result.loc[0, 'Coverage %'] == 100.0
+
+
+def test_collapse_feature_runs_stitches_across_chunks():
+    pings = pd.DataFrame({'unit': ['A'] * 6, 'feature': [3, 3, -1, 3, 3, 5], 'start': range(6),
+                          'lo': [1.0, 9.0, np.nan, 50.0, 40.0, 0.0]})
+    pings['hi'] = pings['lo']
+    whole = _collapse_feature_runs(pings)
+    parts = pd.concat([_collapse_feature_runs(pings.iloc[i:i + 2]) for i in range(0, 6, 2)], ignore_index=True)
+    pd.testing.assert_frame_equal(_collapse_feature_runs(parts), whole)
+    assert whole['feature'].tolist() == [3, -1, 3, 5]
+    assert whole.loc[whole['feature'] == 3, ['lo', 'hi']].values.tolist() == [[1.0, 9.0], [40.0, 50.0]]
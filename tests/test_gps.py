@@ -0,0 +1,397 @@
+"""GPS parsing and ITSA verification, checked against the original per-row implementation."""
+import io
+import random
+import re
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from routeverify.gps import (COVERAGE_ONE_CORNER_METERS, CoverageIndex, RastracGps, StreetIndex, _collapse_runs,
+                             load_rastrac_gps, normalize_street, normalize_streets, parse_rastrac_csv, project_lonlat,
+                             street_from_address, streets_from_addresses, streets_match, verify_itsas_against_gps)
+
+# ─── BASELINE ──────────────────────────────────────────────────────────────────
+# The per-row code these functions replaced, kept verbatim as the reference.
+
+
+def baseline_parse_rastrac_csv(gps_df: pd.DataFrame) -> set:
+    streets_visited = set()
+    addr_col = next((c for c in gps_df.columns if 'addr' in c.lower() or c.lower() == 'address'), None)
+    if not addr_col:
+        return streets_visited
+    for addr in gps_df[addr_col].dropna():
+        parts = str(addr).strip().split(',')
+        if parts:
+            street_only = re.sub(r'^\d+\s+', '', parts[0].strip()).strip().upper()
+            if street_only:
+                streets_visited.add(street_only)
+    return streets_visited
+
+
+def baseline_normalize_street(name: str) -> str:
+    name = name.upper().strip()
+    for full, abbr in {'AVENUE':'AVE','STREET':'ST','BOULEVARD':'BLVD','DRIVE':'DR','COURT':'CT',
+                       'PLACE':'PL','ROAD':'RD','LANE':'LN','TERRACE':'TER','HIGHWAY':'HWY','PARKWAY':'PKWY'}.items():
+        name = re.sub(r'\b' + full + r'\b', abbr, name)
+    return name.strip()
+
+
+def baseline_verify_itsas_against_gps(itsas: List[Dict], streets_visited: set) -> pd.DataFrame:
+    rows = []
+    norm_visited = {baseline_normalize_street(s) for s in streets_visited}
+    for itsa in itsas:
+        num = itsa.get('number', '?')
+        street = str(itsa.get('street', '')).strip()
+        from_cross = itsa.get('from_cross', '')
+        to_cross = itsa.get('to_cross', '')
+        side = itsa.get('side', 'B')
+        norm_street = baseline_normalize_street(street)
+        matched = norm_street in norm_visited
+        if not matched:
+            street_words = set(norm_street.split())
+            for visited in norm_visited:
+                if len(street_words & set(visited.split())) >= min(2, len(street_words)):
+                    matched = True
+                    break
+        status = "✅ DONE" if matched else "❌ SKIPPED"
+        rows.append({"ITSA #": num, "Street": street, "From": from_cross, "To": to_cross, "Side": side, "Status": status})
+    return pd.DataFrame(rows)
+
+
+# ─── FIXTURES ──────────────────────────────────────────────────────────────────
+
+STREET_NAMES = [
+    # abbreviations, including suffixes inside longer words that must be left alone
+    'MAIN STREET', 'Park Avenue', 'ocean parkway', 'GRAND CONCOURSE', 'HYLAN BOULEVARD', 'RIVERSIDE DRIVE',
+    'ST MARKS PLACE', 'CROSS BAY ROAD', 'MAIDEN LANE', 'CLINTON TERRACE', 'WEST SIDE HIGHWAY', 'EAST COURT',
+    'AVENUE A', 'STREETER AVE', 'AVENUES', 'DRIVEWAY', 'PLACEMENT RD', 'MAIN ST.', 'BROADWAY',
+    # ordinals
+    '1ST AVENUE', '2ND AVE', '3RD STREET', '42ND STREET', 'EAST 110TH STREET', 'BEACH 116 STREET',
+    # directionals
+    'W 4 STREET', 'WEST 4TH ST', 'NORTH CONDUIT AVENUE', 'SOUTH BOULEVARD', 'E 14 ST', 'N/S FDR DRIVE',
+    # whitespace, case, blanks
+    '  main   street  ', '\tbroadway\n', '', '   ', 'st', 'avenue', 'STREET AVENUE STREET',
+    # non-ASCII
+    'straße', 'AVENIDA ÑANDÚ', 'MAIN\xa0STREET', 'CAFÉ AVENUE',
+]
+
+ADDRESSES = [
+    '123 MAIN STREET, NEW YORK, NY', '  45  W 4 STREET ,BROOKLYN', '7 Park Avenue', 'NO HOUSE NUMBER RD, NY',
+    '100-12 QUEENS BLVD, QUEENS', '12B ELM ST', '12 ', '12', ', NY', '', '   ', 'BROADWAY', '1 A\nB, C',
+    '\t9 OCEAN PKWY\t', '12\xa0MAIN ST, NY', '١٢ MAIN ST', 'straße 1', '7\x0bOAK AVENUE', '99 , NY',
+    np.nan, None, 5, 12.5,
+]
+
+
+def random_street_names(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = ['MAIN', 'PARK', 'ELM', 'OCEAN', '1ST', '42ND', 'W', 'EAST', 'N', 'ST', 'AVE', 'STREET', 'AVENUE',
+             'BOULEVARD', 'PARKWAY', 'DRIVE', 'PLACE', 'ROAD', 'LANE', 'TERRACE', 'HIGHWAY', 'COURT', 'BROADWAY',
+             'avenue', 'Street', 'STREETS', 'XAVENUE', 'ß', 'É']
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(0, 4))) + rng.choice(['', ' ', '  '])
+            for _ in range(n)]
+
+
+# ─── NORMALIZATION ─────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize('name', STREET_NAMES)
+def test_normalize_street_matches_baseline(name):
+    assert normalize_street(name) == baseline_normalize_street(name)
+
+
+def test_normalize_streets_matches_baseline():
+    names = STREET_NAMES + random_street_names(2000)
+    assert normalize_streets(names).tolist() == [baseline_normalize_street(n) for n in names]
+
+
+# ─── ADDRESS PARSING ───────────────────────────────────────────────────────────
+
+def test_streets_from_addresses_matches_baseline():
+    addresses = pd.Series(ADDRESSES, dtype=object)
+    expected = [street_from_address(a) for a in addresses.dropna()]
+    assert streets_from_addresses(addresses).tolist() == expected
+    assert expected == [re.sub(r'^\d+\s+', '', str(a).strip().split(',')[0].strip()).strip().upper()
+                        for a in addresses.dropna()]
+
+
+def test_streets_from_addresses_on_string_column():
+    # Arrow-backed str columns take the kernel path; results must not depend on the dtype
+    addresses = pd.Series([a for a in ADDRESSES if isinstance(a, str)], dtype='str')
+    assert streets_from_addresses(addresses).tolist() == [street_from_address(a) for a in addresses]
+
+
+@pytest.mark.parametrize('column', ['Address', 'Street Address', 'address', 'ADDR'])
+def test_parse_rastrac_csv_matches_baseline(column):
+    rng = random.Random(1)
+    addresses = ADDRESSES + [f"{rng.randint(1, 999)} {name}, NY" for name in random_street_names(500, seed=2)]
+    gps_df = pd.DataFrame({'Vehicle': 'T1', column: addresses, 'Speed': 0})
+    assert parse_rastrac_csv(gps_df) == baseline_parse_rastrac_csv(gps_df)
+
+
+def test_parse_rastrac_csv_without_address_column():
+    gps_df = pd.DataFrame({'Vehicle': ['T1'], 'Lat': [40.7]})
+    assert parse_rastrac_csv(gps_df) == baseline_parse_rastrac_csv(gps_df) == set()
+
+
+# ─── STREAMING CSV INGESTION ───────────────────────────────────────────────────
+
+def write_export(path, n: int = 400, seed: int = 5, address_column: str = 'Address'):
+    """Rastrac-like export with extra columns, quoted commas, blanks and repeated addresses."""
+    rng = random.Random(seed)
+    addresses = ADDRESSES[:-4] + [f"{rng.randint(1, 999)} {name}, NY {rng.randint(10001, 10099)}"
+                                  for name in random_street_names(60, seed=seed)]
+    gps_df = pd.DataFrame({
+        'Unit': [rng.choice(['24DP-411', '24DP-412']) for _ in range(n)],
+        'Speed': [rng.randint(0, 40) for _ in range(n)],
+        address_column: [rng.choice(addresses + [None]) for _ in range(n)],
+        'Event': 'Moving',
+    })
+    gps_df.to_csv(path, index=False)
+    return gps_df
+
+
+@pytest.mark.parametrize('chunksize', [1, 7, 100_000])
+def test_load_rastrac_gps_matches_whole_file_parse(tmp_path, chunksize):
+    path = tmp_path / 'gps.csv'
+    write_export(path)
+    expected = baseline_parse_rastrac_csv(pd.read_csv(path))
+    assert load_rastrac_gps(str(path), chunksize=chunksize).streets == expected
+    with open(path, 'rb') as f:  # uploads arrive as file objects
+        assert load_rastrac_gps(io.BytesIO(f.read()), chunksize=chunksize).streets == expected
+
+
+def test_load_rastrac_gps_reads_only_needed_columns(tmp_path, monkeypatch):
+    path = tmp_path / 'gps.csv'
+    write_export(path, address_column='Street Address')
+    calls = []
+    read_csv = pd.read_csv
+
+    def recording_read_csv(*args, **kwargs):
+        calls.append(kwargs)
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_csv', recording_read_csv)
+    gps = load_rastrac_gps(str(path), chunksize=50)
+    assert gps.streets == baseline_parse_rastrac_csv(read_csv(path))
+    header_read, body_read = calls
+    assert header_read['nrows'] == 0
+    assert sorted(body_read['usecols']) == ['Street Address', 'Unit'] and body_read['chunksize'] == 50
+
+
+def test_load_rastrac_gps_without_address_column(tmp_path):
+    path = tmp_path / 'gps.csv'
+    pd.DataFrame({'Unit': ['T1'], 'Speed': [3]}).to_csv(path, index=False)
+    assert load_rastrac_gps(str(path)).streets == set()
+
+
+# ─── STREET INDEX ──────────────────────────────────────────────────────────────
+
+def baseline_matches(norm_street: str, norm_visited: set) -> bool:
+    if norm_street in norm_visited:
+        return True
+    street_words = set(norm_street.split())
+    return any(len(street_words & set(v.split())) >= min(2, len(street_words)) for v in norm_visited)
+
+
+INDEX_VISITED = [
+    [],
+    ['MAIN STREET'],
+    ['BROADWAY'],
+    [''],
+    ['MAIN STREET', 'W 4 STREET', 'WEST 4TH ST', 'OCEAN PARKWAY', 'EAST 110TH STREET', 'BROADWAY', '   '],
+    random_street_names(300, seed=6),
+]
+
+
+@pytest.mark.parametrize('visited', INDEX_VISITED)
+def test_street_index_matches_baseline(visited):
+    index = StreetIndex(set(visited))
+    norm_visited = {baseline_normalize_street(s) for s in visited}
+    assert index.streets == norm_visited
+    for name in STREET_NAMES + ['MAIN', 'ST', 'W 4', 'WEST', 'MAIN MAIN ST'] + random_street_names(300, seed=7):
+        norm = baseline_normalize_street(name)
+        assert index.matches(norm) == baseline_matches(norm, norm_visited), name
+
+
+@pytest.mark.parametrize('visited', INDEX_VISITED)
+def test_street_index_lookup_matches_brute_force(visited):
+    index = StreetIndex(set(visited))
+    for name in STREET_NAMES + ['MAIN', 'ST', 'W 4', 'WEST'] + random_street_names(300, seed=8):
+        norm = baseline_normalize_street(name)
+        if norm in index.streets:
+            expected = [norm]
+        elif norm.split():
+            expected = sorted(v for v in index.streets if streets_match(norm, v))
+        else:
+            expected = []  # blank streets never resolve to geometry
+        assert sorted(index.lookup(norm)) == expected, name
+
+
+# ─── TRUCK UNITS ───────────────────────────────────────────────────────────────
+
+def gps_with_units(*units: str) -> RastracGps:
+    gps = RastracGps()
+    gps.by_unit = {unit: set() for unit in units}
+    return gps
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('24DP-421.jpg', '24DP421'),
+    ('24DP-421_M4.jpg', '24DP421'),
+    ('24dp 421_route 4.png', '24DP421'),
+    ('Route 4 24DP-421.pdf', '24DP421'),
+    ('24DP421.jpg', '24DP421'),
+    ('24DP-421_2.jpg', '24DP421'),   # not 24DP4212: the _2 is a separate field
+    ('24DP-4212.jpg', '24DP4212'),
+    ('TRK-1_2.jpg', None),           # not TRK12 for the same reason
+    ('TRK-12_a.jpg', 'TRK12'),
+    ('XTRK12.jpg', None),            # a unit must start on a word boundary
+    ('TRK123.jpg', None),            # ... and end on one
+    ('R12_TRK-12.jpg', 'TRK12'),     # ids shorter than 3 characters are never matched
+    ('scan_0001.jpg', None),
+])
+def test_unit_in_name_matches_whole_words(filename, expected):
+    gps = gps_with_units('24DP421', '24DP4212', 'TRK12', '12')
+    assert gps.unit_in_name(filename) == expected
+
+
+# ─── PROJECTION ────────────────────────────────────────────────────────────────
+
+def great_circle_metres(lat1, lon1, lat2, lon2):
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    h = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2
+    return 2 * 6_371_008.8 * np.arcsin(np.sqrt(h))
+
+
+@pytest.mark.parametrize('lat, lon', [(40.7128, -74.0060), (40.51, -74.24), (40.90, -73.79)])
+@pytest.mark.parametrize('dlat, dlon', [(0.001, 0.0), (0.0, 0.001), (0.001, 0.001), (0.01, -0.02)])
+def test_project_lonlat_distances_match_great_circle(lat, lon, dlat, dlon):
+    x0, y0 = project_lonlat(lon, lat)
+    x1, y1 = project_lonlat(lon + dlon, lat + dlat)
+    expected = great_circle_metres(lat, lon, lat + dlat, lon + dlon)
+    assert np.hypot(x1 - x0, y1 - y0) == pytest.approx(expected, rel=0.006)
+    if dlon == 0:
+        assert x1 == x0  # a north-south step never moves east-west
+    if dlat == 0:
+        assert y1 == y0
+
+
+# ─── BLOCK COVERAGE ────────────────────────────────────────────────────────────
+
+def pings_frame(rows):
+    """Pings as (street, minute, house, x, y); minute None for an untimed ping."""
+    return pd.DataFrame({
+        'unit': 'T1',
+        'street': [r[0] for r in rows],
+        'start': [pd.Timestamp('2026-10-17 06:00') + pd.Timedelta(minutes=r[1]) if r[1] is not None else pd.NaT
+                  for r in rows],
+        'house_first': [r[2] for r in rows], 'house_last': [r[2] for r in rows],
+        'house_min': [r[2] for r in rows], 'house_max': [r[2] for r in rows],
+        'x_first': [r[3] for r in rows], 'y_first': [r[4] for r in rows],
+        'x_last': [r[3] for r in rows], 'y_last': [r[4] for r in rows],
+    }).assign(end=lambda df: df['start'])
+
+
+def test_collapse_runs_takes_anchors_from_the_real_first_and_last_pings():
+    runs = _collapse_runs(pings_frame([
+        ('MAIN ST', 0, np.nan, np.nan, np.nan),  # corner ping with no house number or fix
+        ('MAIN ST', 1, 10, 5.0, 0.0),
+        ('MAIN ST', 2, 40, 50.0, 0.0),
+        ('MAIN ST', 3, np.nan, np.nan, np.nan),
+        ('ELM ST', 4, 7, 60.0, 10.0),
+    ]))
+    main = runs.iloc[0]
+    assert pd.isna(main['house_first']) and pd.isna(main['x_first']) and pd.isna(main['x_last'])
+    assert (main['house_min'], main['house_max']) == (10, 40)
+    assert list(runs['street']) == ['MAIN ST', 'ELM ST'] and list(runs.columns) == list(pings_frame([]).columns)
+
+
+def test_collapse_runs_stitches_runs_across_chunks():
+    rows = [('MAIN ST', m, 10 * m, float(m), 0.0) for m in range(6)] + [('ELM ST', 6, 1, 6.0, 1.0)]
+    whole = _collapse_runs(pings_frame(rows))
+    stitched = _collapse_runs(pd.concat([_collapse_runs(pings_frame(rows[:3])), _collapse_runs(pings_frame(rows[3:]))],
+                                        ignore_index=True))
+    pd.testing.assert_frame_equal(stitched, whole)
+
+
+@pytest.mark.parametrize('gap_minutes, corner', [(1, True), (4, True), (30, False), (180, False)])
+def test_long_time_gap_is_not_a_corner(gap_minutes, corner):
+    runs = _collapse_runs(pings_frame([
+        ('MAIN ST', 0, 10, 0.0, 0.0), ('MAIN ST', 1, 90, 80.0, 0.0),
+        ('ELM ST', 1 + gap_minutes, 2, 85.0, 5.0),
+    ]))
+    index = CoverageIndex(runs)
+    assert ('ELM ST' in index.anchors.get('MAIN ST', {})) == corner
+    assert ('MAIN ST' in index.anchors.get('ELM ST', {})) == corner
+
+
+@pytest.mark.parametrize('jump_x, corner', [(5.0, True), (100.0, True), (2000.0, False)])
+def test_untimed_runs_break_on_distance(jump_x, corner):
+    runs = pings_frame([('MAIN ST', None, 10, 0.0, 0.0), ('ELM ST', None, 2, jump_x, 0.0)])
+    index = CoverageIndex(runs)
+    assert ('ELM ST' in index.anchors.get('MAIN ST', {})) == corner
+
+
+def test_coverage_ignores_turns_across_a_break():
+    # MAIN ST driven 100-200 between 1ST and 2ND AVE; after lunch the truck shows up on OAK ST
+    rows = [('1ST AVE', 0, 5, 0.0, 0.0)] + [('MAIN ST', 1 + i, 100 + 10 * i, 0.0, 0.0) for i in range(11)]
+    rows += [('2ND AVE', 13, 7, 0.0, 0.0), ('MAIN ST', 14, 200, 0.0, 0.0), ('OAK ST', 120, 3, 0.0, 0.0)]
+    index = CoverageIndex(_collapse_runs(pings_frame(rows)))
+    assert index.coverage('MAIN ST', '1ST AVE', '2ND AVE') == 1.0
+    assert 'OAK ST' not in index.anchors['MAIN ST']  # never seen turning onto OAK ST
+
+
+def test_turning_off_partway_is_partial_not_done():
+    # In from 1ST AVE at 100, off onto OAK ST at 140: the 2ND AVE corner is never reached
+    rows = [('1ST AVE', 0, 5, 0.0, 0.0)] + [('MAIN ST', 1 + i, 100 + 10 * i, 0.0, 0.0) for i in range(5)]
+    rows += [('OAK ST', 6, 3, 0.0, 0.0)]
+    index = CoverageIndex(_collapse_runs(pings_frame(rows)))
+    assert index.coverage('MAIN ST', '1ST AVE', '2ND AVE') == pytest.approx(0.4)
+    result = verify_itsas_against_gps([{'number': 1, 'street': 'MAIN ST', 'from_cross': '1ST AVE',
+                                        'to_cross': '2ND AVE'}], {'MAIN ST', '1ST AVE', 'OAK ST'}, index)
+    assert result.loc[0, 'Status'] == '❌ SKIPPED' and result.loc[0, 'Coverage %'] == 40.0
+
+
+def test_driving_through_the_far_corner_is_done():
+    rows = [('1ST AVE', 0, 5, 0.0, 0.0)] + [('MAIN ST', 1 + i, 100 + 10 * i, 0.0, 0.0) for i in range(30)]
+    index = CoverageIndex(_collapse_runs(pings_frame(rows)))
+    assert index.coverage('MAIN ST', '2ND AVE', '1ST AVE') == 1.0
+    assert index.coverage('MAIN ST', '3RD AVE', '4TH AVE') is None  # no corner seen: name matching decides
+
+
+def test_one_corner_in_metres_without_house_numbers():
+    rows = [('1ST AVE', 0, np.nan, -30.0, 0.0)] + [('MAIN ST', 1 + i, np.nan, 0.0, 10.0 * i) for i in range(7)]
+    rows += [('OAK ST', 8, np.nan, 30.0, 60.0)]
+    index = CoverageIndex(_collapse_runs(pings_frame(rows)))
+    assert index.coverage('MAIN ST', '1ST AVE', '2ND AVE') == pytest.approx(60.0 / COVERAGE_ONE_CORNER_METERS)
+
+
+# ─── VERIFICATION ──────────────────────────────────────────────────────────────
+
+def _itsas(streets: List[str]) -> List[Dict]:
+    return [{'number': i, 'street': s, 'from_cross': 'A', 'to_cross': 'B', 'side': 'B'}
+            for i, s in enumerate(streets, 1)]
+
+
+@pytest.mark.parametrize('visited', [
+    {'MAIN ST', 'PARK AVE', 'W 4 ST', '42ND STREET', 'OCEAN PARKWAY'},
+    {'BROADWAY'},
+    set(),
+])
+def test_verify_itsas_against_gps_matches_baseline(visited):
+    itsas = _itsas(STREET_NAMES + ['MAIN', 'W 4', '42ND', 'OCEAN PKWY', 'FOURTH AVE'])
+    itsas.append({'number': 99})  # missing street / crosses / side
+    result = verify_itsas_against_gps(itsas, visited)
+    expected = baseline_verify_itsas_against_gps(itsas, visited)
+    pd.testing.assert_frame_equal(result[expected.columns], expected)
+    assert result['Coverage %'].isna().all()
+
+
+def test_verify_itsas_against_gps_randomized():
+    visited = set(random_street_names(300, seed=3))
+    itsas = _itsas(random_street_names(300, seed=4))
+    result = verify_itsas_against_gps(itsas, visited)
+    expected = baseline_verify_itsas_against_gps(itsas, visited)
+    pd.testing.assert_frame_equal(result[expected.columns], expected)
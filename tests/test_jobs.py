@@ -0,0 +1,33 @@
+"""Finished extraction jobs are attached in upload order within a batch."""
+import pytest
+
+from routeverify.jobs import ExtractionJob, ready_jobs
+
+
+def jobs(statuses: str, batch='b1'):
+    """One job per character: q(ueued), r(unning), d(one), f(ailed)."""
+    names = {'q': 'queued', 'r': 'running', 'd': 'done', 'f': 'failed'}
+    out = []
+    for i, c in enumerate(statuses):
+        job = ExtractionJob(None, f'{batch}-{i}.jpg', b'', f'TBD-{i + 1}', f'BATCH-{i + 1}', None, batch=batch)
+        job.status = names[c]
+        out.append(job)
+    return out
+
+
+@pytest.mark.parametrize('statuses, expected', [
+    ('dddd', [0, 1, 2, 3]),
+    ('rddd', []),            # later sheets wait for the first
+    ('drdd', [0]),
+    ('fdqd', [0, 1]),        # a failed sheet doesn't hold up the rest
+    ('qqqq', []),
+])
+def test_ready_jobs_follow_upload_order(statuses, expected):
+    batch = jobs(statuses)
+    assert ready_jobs(batch) == [batch[i] for i in expected]
+
+
+def test_batches_and_single_adds_do_not_wait_for_each_other():
+    first, second = jobs('rd', batch='b1'), jobs('dd', batch='b2')
+    single = jobs('d', batch=None)
+    assert ready_jobs(first + single + second) == [*single, *second]
@@ -0,0 +1,66 @@
+"""Shift store round trips: save, load, re-sync, and session files loaded into more than one shift."""
+import pytest
+
+from routeverify.gps import RastracGps, apply_override, build_route_entry
+from routeverify.session import Shift, ShiftStore, dump_session, load_session
+
+ITSAS = [{'number': 1, 'street': 'MAIN ST', 'from_cross': '1ST AVE', 'to_cross': '2ND AVE', 'side': 'B'},
+         {'number': 2, 'street': 'OAK ST', 'from_cross': '1ST AVE', 'to_cross': '2ND AVE', 'side': 'B'},
+         {'number': 3, 'street': 'ELM ST', 'from_cross': '1ST AVE', 'to_cross': '2ND AVE', 'side': 'B'}]
+SHIFT = ('2026-01-05', 'Manhattan 1')
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ShiftStore(str(tmp_path / 'db' / 'shifts.sqlite3'))
+
+
+def route(truck: str = '24DP-411', name: str = 'M4') -> dict:
+    gps = RastracGps({'MAIN ST', 'OAK ST'})
+    return build_route_entry(truck, name, {'itsas': ITSAS}, gps)
+
+
+def summary(routes: list) -> list:
+    return [(r['id'], r['truck'], r['route'], r['notes'], r['done'], r['total'], sorted(r['manual_overrides']),
+             r['df']['Status'].tolist()) for r in routes]
+
+
+def test_save_load_and_resync_round_trip(store):
+    shift = Shift(store, *SHIFT)
+    for truck in ('24DP-411', '24DP-412'):
+        shift.add(route(truck))
+    assert shift.sync() == 2 and shift.sync() == 0
+    first, second = shift.routes
+    first['notes'] = 'late start'
+    shift.fleet['done'] += apply_override(second, 3, True)
+    assert shift.sync() == 2
+
+    reloaded = Shift(store, *SHIFT)
+    assert summary(reloaded.routes) == summary(shift.routes)
+    assert reloaded.fleet == shift.fleet == {'done': 5, 'total': 6}
+    assert reloaded.sync() == 0  # nothing changed since it was read
+    assert Shift(store, SHIFT[0], 'Bronx 2').routes == []
+
+    shift.remove(first['id'])
+    assert shift.sync() == 0  # only the order changed
+    assert summary(Shift(store, *SHIFT).routes) == summary([second])
+
+
+def test_override_edits_without_a_status_bump_are_saved(store):
+    shift = Shift(store, *SHIFT)
+    shift.add(route())
+    shift.sync()
+    shift.routes[0]['manual_overrides']['3'] = True
+    assert shift.sync() == 1
+    assert Shift(store, *SHIFT).routes[0]['manual_overrides'] == {'3': True}
+
+
+def test_session_file_loaded_into_two_shifts_keeps_both(store):
+    data = dump_session([route('24DP-411'), route('24DP-412')])
+    for garage in ('Manhattan 1', 'Bronx 2'):
+        shift = Shift(store, SHIFT[0], garage)
+        shift.replace(load_session(data))
+        shift.sync()
+    manhattan, bronx = Shift(store, SHIFT[0], 'Manhattan 1').routes, Shift(store, SHIFT[0], 'Bronx 2').routes
+    assert [r['truck'] for r in manhattan] == [r['truck'] for r in bronx] == ['24DP-411', '24DP-412']
+    assert not {r['id'] for r in manhattan} & {r['id'] for r in bronx}
@@ -0,0 +1,20 @@
+"""Shared helpers: clashing output filenames get the same suffixes in the app ZIP and the batch runner."""
+import io
+import zipfile
+
+from routeverify.utils import unique_filename
+from routeverify.wlo import build_wlo_zip
+
+
+def test_unique_filename_numbers_repeats():
+    seen = {}
+    names = [unique_filename(n, seen) for n in ['a.xlsx', 'b.xlsx', 'a.xlsx', 'a.xlsx', 'noext', 'noext']]
+    assert names == ['a.xlsx', 'b.xlsx', 'a (2).xlsx', 'a (3).xlsx', 'noext', 'noext (2)']
+
+
+def test_build_wlo_zip_uses_unique_names():
+    items = [('WLO.xlsx', ('one',)), ('WLO.xlsx', ('two',)), ('Other.xlsx', ('three',))]
+    data = build_wlo_zip(items, render=lambda key: key.encode())
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert {n: zf.read(n) for n in zf.namelist()} == {'WLO.xlsx': b'one', 'WLO (2).xlsx': b'two',
+                                                          'Other.xlsx': b'three'}
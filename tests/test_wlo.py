@@ -0,0 +1,44 @@
+"""DS-659 Work Left Out workbooks written straight from the cached template XML."""
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from routeverify import wlo
+from routeverify.wlo import TEMPLATE_PATH, WLO_FIRST_ROW, WLO_PAGE_ROWS, generate_work_left_out, get_wlo_template
+
+ROUTE_INFO = {'district': 'BK11', 'section': 'BKN11', 'vehicle_type': 'REAR LOADER', 'material': 'REFUSE'}
+
+
+def missed(n: int) -> pd.DataFrame:
+    return pd.DataFrame({'ITSA #': range(1, n + 1), 'Side': 'B', 'Street': [f'STREET {i}' for i in range(1, n + 1)],
+                         'From': 'A & B <AVE>', 'To': '1ST AVE'})
+
+
+def read_pages(data: bytes) -> list:
+    from openpyxl import load_workbook
+    wb = load_workbook(io.BytesIO(data))
+    form_rows = range(WLO_FIRST_ROW, WLO_FIRST_ROW + WLO_PAGE_ROWS)
+    return [(ws.title, ws['A3'].value, ws['D3'].value,
+             [tuple(ws[f'{col}{row}'].value for col in 'ABCDHJ') for row in form_rows])
+            for ws in wb.worksheets]
+
+
+def test_template_is_parsed_once_per_file_version():
+    mtime = os.path.getmtime(TEMPLATE_PATH)
+    template = get_wlo_template(TEMPLATE_PATH, mtime)
+    assert template is not None and get_wlo_template(TEMPLATE_PATH, mtime) is template
+
+
+@pytest.mark.parametrize('n, pages', [(1, 1), (WLO_PAGE_ROWS, 1), (WLO_PAGE_ROWS + 1, 2), (2 * WLO_PAGE_ROWS + 5, 3)])
+def test_continuation_sheets_open_and_match_openpyxl(monkeypatch, n, pages):
+    patched = read_pages(generate_work_left_out(missed(n), ROUTE_INFO))
+    assert len(patched) == pages
+    rows = [row for _, _, _, page_rows in patched for row in page_rows if row[1] is not None]
+    assert [row[1] for row in rows] == list(range(1, n + 1))
+    assert rows[-1] == ('BKN11', n, 'B', f'STREET {n}', 'A & B <AVE>', '1ST AVE')
+    assert all((a3, d3) == ('BK11', 'BKN11') for _, a3, d3, _ in patched)
+    assert [title for title, *_ in patched[1:]] == [f'{patched[0][0]} ({page})' for page in range(2, pages + 1)]
+    monkeypatch.setattr(wlo, 'get_wlo_template', lambda *args: None)
+    assert read_pages(generate_work_left_out(missed(n), ROUTE_INFO)) == patched